@@ -0,0 +1,227 @@
+"""Storage and summary benchmarks over synthetic journals.
+
+    python -m caltrack.benchmark [--sizes 10000,100000,1000000] [--years 3]
+        [--mix food=0.6,activity=0.15,fluid=0.25] [--weight-every 1]
+        [--backend ndjson|sqlite] [--out results.jsonl]
+
+Each size runs in its own process with HOME pointed at a scratch directory,
+so the real ~/.caltrack is never touched. Results are JSON lines, one per
+(size, operation), tagged with the git commit so runs can be compared.
+"""
+import io
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+import contextlib
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from unittest import mock
+
+DEFAULT_SIZES = (10_000, 100_000, 1_000_000)
+DEFAULT_MIX = {"food": 0.6, "activity": 0.15, "fluid": 0.25}
+
+MEALS = ("breakfast", "lunch", "dinner", "afternoon snack", "late snack")
+FOODS = ("oatmeal", "greek yogurt", "chicken salad", "pasta", "rice and beans", "apple",
+         "banana", "protein bar", "salmon", "steak", "sandwich", "pizza", "soup", "eggs")
+ACTIVITIES = ("running", "cycling", "walking", "swimming", "weights", "yoga", "rowing")
+FLUIDS = ("water", "coffee", "tea", "milk", "orange juice", "sparkling water")
+
+def generate_records(count: int, years: float = 3, mix: dict = None, weight_every: int = 1,
+                     end: date = None, seed: int = 0) -> list:
+    """Synthetic tracker records plus weigh-ins, spread evenly over `years` ending at `end`.
+
+    `count` is the number of tracker entries; `mix` gives the share of each
+    tracker type and weigh-ins are added every `weight_every` days (0 for
+    none) as a slow random walk.
+    """
+    rng = random.Random(seed)
+    mix = mix or DEFAULT_MIX
+    types, weights = zip(*mix.items())
+    end = end or date.today()
+    days = max(1, int(365 * years))
+    start = end - timedelta(days=days - 1)
+    out = []
+    for i in range(count):
+        d = (start + timedelta(days=i * days // count)).isoformat()
+        rec_id = f"{i:08x}"
+        t = rng.choices(types, weights)[0]
+        if t == "food":
+            out.append({"id": rec_id, "date": d, "type": "food", "description": rng.choice(FOODS),
+                        "meal": rng.choice(MEALS), "kcal": rng.randrange(50, 900)})
+        elif t == "activity":
+            out.append({"id": rec_id, "date": d, "type": "activity", "description": rng.choice(ACTIVITIES),
+                        "kcal_burned": -rng.randrange(100, 800)})
+        else:
+            out.append({"id": rec_id, "date": d, "type": "fluid", "description": rng.choice(FLUIDS),
+                        "volume_ml": rng.choice((150, 250, 330, 500, 750))})
+    if weight_every:
+        kg = 85.0
+        for n, day in enumerate(range(0, days, weight_every)):
+            kg = round(kg + rng.uniform(-0.3, 0.28), 1)
+            ts = datetime.combine(start + timedelta(days=day), datetime.min.time()).replace(hour=7)
+            out.append({"id": f"w{n:07x}", "type": "weight", "ts": ts.isoformat(), "kg": kg})
+    return out
+
+def _timed(results: list, size: int, op: str, fn, repeat: int = 1, setup=None):
+    """Run fn `repeat` times (after setup, untimed) and record the per-call times."""
+    times = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        with contextlib.redirect_stdout(io.StringIO()):
+            t0 = time.perf_counter()
+            fn()
+            times.append(time.perf_counter() - t0)
+    times.sort()
+    results.append({
+        "size": size, "op": op, "repeat": repeat,
+        "min_ms": round(times[0] * 1000, 3),
+        "median_ms": round(times[len(times) // 2] * 1000, 3),
+        "total_ms": round(sum(times) * 1000, 3),
+    })
+
+def run_size(size: int, years: float, mix: dict, weight_every: int, backend: str) -> list:
+    """Generate a journal of `size` entries under the current HOME and time each operation."""
+    from caltrack import cli, llm_client
+    from caltrack.models import Command, Range
+    from caltrack.storage import backend as storage, journal, rollup, textindex
+    from caltrack.domains import tracker, weight
+
+    records = generate_records(size, years, mix, weight_every)
+    journal._rewrite_all_records(records)
+    if backend == "sqlite":
+        from caltrack.storage import sqlite_store
+        sqlite_store.migrate_from_ndjson()
+    tracker_ids = [r["id"] for r in records if r["type"] != "weight"]
+    first = date.fromisoformat(records[0]["date"])
+    last = date.fromisoformat(records[size - 1]["date"])
+    del records
+
+    def cold():
+        # Drop the in-process caches so each read pays what a fresh CLI run pays.
+        journal._cache.clear()
+        rollup._store.forget()
+        textindex._store.forget()
+
+    rng = random.Random(1)
+    results = []
+    counter = iter(range(10 ** 9))
+    _timed(results, size, "append_record", lambda: tracker.add_food(
+        f"b{next(counter):07x}", last, "lunch", "benchmark", 500), repeat=50)
+    _timed(results, size, "read_all_records", storage.read_all_records, repeat=3, setup=cold)
+    _timed(results, size, "read_all_records_warm", storage.read_all_records, repeat=3)
+    _timed(results, size, "list_entries", tracker.list_entries, repeat=3, setup=cold)
+    week = (last - timedelta(days=6), last)
+    _timed(results, size, "list_entries_week", lambda: tracker.list_entries(*week), repeat=5, setup=cold)
+    tracker.list_entries(contains="oatmeal")  # build the text index once, untimed
+    _timed(results, size, "search_contains", lambda: tracker.list_entries(contains="oatmeal"), repeat=3, setup=cold)
+    _timed(results, size, "search_contains_week", lambda: tracker.list_entries(*week, contains="oat"),
+           repeat=5, setup=cold)
+    _timed(results, size, "update_entry", lambda: tracker.update_entry(
+        rng.choice(tracker_ids), {"description": "edited"}), repeat=20, setup=cold)
+    _timed(results, size, "delete_entry", lambda: tracker.delete_entry(tracker_ids.pop()), repeat=20, setup=cold)
+    _timed(results, size, "list_weights", weight.list_weights, repeat=3, setup=cold)
+
+    _time_summaries(results, size, first, last)
+    _timed(results, size, "daily_totals", lambda: tracker.daily_totals(first, last), repeat=3, setup=cold)
+
+    # Range delete through the CLI, with the LLM replaced by a canned parse
+    # and the confirmation prompt answered "y".
+    span = iter(range(10 ** 6))
+
+    def fake_llm(user_input, use_cache=True):
+        day = first + timedelta(days=7 * next(span))
+        value = f"{day.isoformat()} to {(day + timedelta(days=6)).isoformat()}"
+        return Command(action="delete", range=Range(type="absolute", value=value))
+
+    llm_client.call_llm = fake_llm
+
+    def cli_delete():
+        argv = sys.argv
+        sys.argv = ["caltrack", "delete everything from that week", "--local"]
+        try:
+            with mock.patch("builtins.input", return_value="y"):
+                cli.main()
+        finally:
+            sys.argv = argv
+
+    _timed(results, size, "cli_range_delete", cli_delete, repeat=5, setup=cold)
+    return results
+
+def _time_summaries(results, size, first, last):
+    """Time summarize_entries over every entry; the list is freed on return."""
+    from caltrack import summary
+    from caltrack.domains import tracker
+    entries = tracker.list_entries()
+    _timed(results, size, "summarize_entries", lambda: summary.summarize_entries(entries, first, last), repeat=3)
+    _timed(results, size, "summarize_entries_verbose",
+           lambda: summary.summarize_entries(entries, first, last, verbose=True), repeat=3)
+
+def _git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=Path(__file__).parent,
+                             capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return out.stdout.strip()
+
+def _parse_mix(text: str) -> dict:
+    mix = {}
+    for part in text.split(","):
+        name, _, share = part.partition("=")
+        if name not in DEFAULT_MIX:
+            raise argparse.ArgumentTypeError(f"unknown entry type in mix: {name}")
+        mix[name] = float(share)
+    return mix
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m caltrack.benchmark", description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)),
+                        help="comma-separated entry counts (default: %(default)s)")
+    parser.add_argument("--years", type=float, default=3, help="span of the journal in years")
+    parser.add_argument("--mix", type=_parse_mix, default=DEFAULT_MIX, help="type shares, e.g. food=0.6,fluid=0.4")
+    parser.add_argument("--weight-every", type=int, default=1, help="days between weigh-ins (0: none)")
+    parser.add_argument("--backend", choices=("ndjson", "sqlite"), default="ndjson")
+    parser.add_argument("--out", help="append results to this JSONL file as well as stdout")
+    parser.add_argument("--worker", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        for row in run_size(args.worker, args.years, args.mix, args.weight_every, args.backend):
+            print(json.dumps(row), flush=True)
+        return
+
+    meta = {"commit": _git_commit(), "python": platform.python_version(), "backend": args.backend,
+            "years": args.years, "mix": args.mix, "weight_every": args.weight_every}
+    out = open(args.out, "a") if args.out else None
+    try:
+        for size in (int(s) for s in args.sizes.split(",")):
+            home = tempfile.mkdtemp(prefix="caltrack-bench-")
+            env = dict(os.environ, HOME=home, CALTRACK_BACKEND=args.backend)
+            cmd = [sys.executable, "-m", "caltrack.benchmark", "--worker", str(size),
+                   "--years", str(args.years), "--mix", ",".join(f"{k}={v}" for k, v in args.mix.items()),
+                   "--weight-every", str(args.weight_every), "--backend", args.backend]
+            try:
+                proc = subprocess.run(cmd, env=env, capture_output=True, text=True)
+            finally:
+                shutil.rmtree(home, ignore_errors=True)
+            if proc.returncode:
+                sys.exit(f"benchmark for {size} entries failed:\n{proc.stderr}")
+            for line in proc.stdout.splitlines():
+                row = dict(meta, **json.loads(line))
+                print(json.dumps(row))
+                if out:
+                    out.write(json.dumps(row) + "\n")
+    finally:
+        if out:
+            out.close()
+
+if __name__ == "__main__":
+    main()
@@ -1,29 +1,34 @@
+import os
 import sys
+import time
 import uuid
 import json
-from datetime import datetime, date
-from dateutil import parser as dateparser
-from caltrack.llm_client import call_llm
+# Keep module-level imports light: openai/pydantic (via llm_client and
+# models), dateutil and numpy (via summary) are imported inside the code
+# paths that need them, so local commands start fast. cli_startup_test.py
+# guards this.
+from datetime import datetime, date, timedelta
+from caltrack import config, metrics
+from caltrack.local_parser import parse_command
+from caltrack.storage import backend as storage, query
 from caltrack.domains import weight as weight_domain
 from caltrack.domains import tracker as tracker_domain
-from caltrack.summary import summarize_entries
+
+DEFAULT_BATCH_WORKERS = 8
 
 def parse_date_range(cmd_data):
     if 'range' in cmd_data and cmd_data['range'] and cmd_data['range'].get('value'):
-        val = cmd_data['range']['value']
-        try:
-            if any(sep in val for sep in ('..', '…', ' to ', '/')):
-                parts = [p.strip() for p in val.replace('…', '..').replace(' to ', '..').replace('/', '..').split('..')]
-                start = date.fromisoformat(parts[0])
-                end = date.fromisoformat(parts[1])
-            else:
-                start = end = date.fromisoformat(val)
-        except ValueError:
-            parsed = dateparser.parse(val, default=datetime.now()).date()
-            start = end = parsed
-        return start, end
+        return query.parse_range(cmd_data['range']['value'])
     return None, None
 
+def _span(rng, target=None):
+    """query.span, or None (after printing the error) when a date can't be read."""
+    try:
+        return query.span(rng, target)
+    except ValueError as e:
+        print(f"ERROR: {e}")
+        return None
+
 def confirm_date(dstr):
     resp = input(f"Date resolved to {dstr}. Is that correct? (y/N) ").strip().lower()
     if resp.startswith('y'):
@@ -34,57 +39,89 @@ def confirm_date(dstr):
     except ValueError:
         sys.exit("Invalid date format. Aborting.")
 
-def main():
-    verbose = '--verbose' in sys.argv
-    command_input = ' '.join(arg for arg in sys.argv[1:] if arg != '--verbose')
+def _delete_by_id(eid):
+    try:
+        tracker_domain.delete_entry(eid)
+        return True
+    except KeyError:
+        pass
+    try:
+        weight_domain.delete(eid)
+        return True
+    except KeyError:
+        return False
 
-    if not command_input:
-        print('Usage: caltrack "<command>" [--verbose]')
-        sys.exit(1)
+def _delete_scope(structured_cmd):
+    """(start, end, contains, description) for a range/contains delete, or None after printing why not."""
+    target = structured_cmd.target
+    contains = target.contains if target else None
+    span = _span(structured_cmd.range, target)
+    if span is None:
+        return None
+    start, end = span
+    # A description filter is enough on its own; otherwise a range is required.
+    if (not start or not end) and not contains:
+        print("ERROR: No valid date or range found for deletion.")
+        return None
+    scope = f"from {start} to {end}" if start and end else "on any date"
+    if contains:
+        scope = f"matching '{contains}' {scope}"
+    return start, end, contains, scope
 
-    try:
-        structured_cmd = call_llm(command_input)
-    except Exception as e:
-        print(f"ERROR: {e}")
-        return
+def _confirm_delete(scope):
+    confirm = input(f"WARNING: This will delete all entries {scope}. Proceed? (y/N) ").strip().lower()
+    if confirm != 'y':
+        print("Aborted by user.")
+        return False
+    return True
 
-    print("DEBUG: Structured LLM response:", structured_cmd)
+def execute(structured_cmd, verbose=False, interactive=True, assume_yes=False):
+    """Carry out a parsed Command; returns False when it could not be applied.
 
+    With interactive=False nothing prompts: dates are taken as parsed, and
+    range deletes only go ahead when assume_yes is set.
+    """
     if not structured_cmd or not structured_cmd.action:
         print("ERROR: LLM returned no action.")
-        return
+        return False
 
     action = structured_cmd.action.lower().replace(' ', '_')
 
     if action == 'delete':
         if structured_cmd.target and structured_cmd.target.id:
             eid = structured_cmd.target.id
-            deleted = tracker_domain.delete_entry(eid) or weight_domain.delete(eid)
-            if deleted:
+            if _delete_by_id(eid):
                 print(f"✔ deleted entry with id={eid}")
-            else:
-                print(f"✘ no entry found with id={eid}")
-            return
+                return True
+            print(f"✘ no entry found with id={eid}")
+            return False
 
-        start, end = parse_date_range(structured_cmd.model_dump())
-        if not start or not end:
-            print("ERROR: No valid date or range found for deletion.")
-            return
-        confirm = input(f"WARNING: This will delete all entries from {start} to {end}. Proceed? (y/N) ").strip().lower()
-        if confirm != 'y':
-            print("Aborted by user.")
-            return
-        entries = tracker_domain.list_entries()
-        to_delete = [e for e in entries if start <= datetime.fromisoformat(e['date']).date() <= end]
-        for e in to_delete:
-            tracker_domain.delete_entry(e['id'])
-        print(f"✔ deleted {len(to_delete)} entries from {start} to {end}")
-        return
+        target = structured_cmd.target
+        resolved = _delete_scope(structured_cmd)
+        if resolved is None:
+            return False
+        start, end, contains, scope = resolved
+        if not assume_yes:
+            if not interactive:
+                print(f"ERROR: Refusing to delete entries {scope} without confirmation (pass --yes).")
+                return False
+            if not _confirm_delete(scope):
+                return False
+        deleted = tracker_domain.delete_entries(
+            start=start, end=end,
+            type_=target.type if target else None,
+            contains=contains,
+        )
+        print(f"✔ deleted {len(deleted)} entries {scope}")
+        return True
 
     if action in ('add', 'add_food', 'consume') and structured_cmd.entries:
         for e in structured_cmd.entries:
             date_str = e.date.isoformat()
-            d = confirm_date(date_str) if structured_cmd.needs_confirmation else date.fromisoformat(date_str)
+            if structured_cmd.needs_confirmation and interactive:
+                d = confirm_date(date_str)
+            else:
+                d = date.fromisoformat(date_str)
             eid = uuid.uuid4().hex[:8]
 
             if hasattr(e, 'meal') and hasattr(e, 'kcal'):
@@ -102,44 +139,242 @@ def main():
                 print(f"✔ weight added: {rec['kg']} kg @ {rec['ts']} (id={rec['id']})")
             else:
                 print(f"Unknown entry type, skipping: {e}")
-        return
+        return True
 
     if action in ('show', 'read', 'list', 'show_all'):
-        entries = tracker_domain.list_entries()
-        if not entries:
-            print('No entries found.')
-            return
-
-        requested_type = structured_cmd.target.type if structured_cmd.target and structured_cmd.target.type else 'all'
-        if requested_type != 'all':
-            entries = [e for e in entries if e.get('type') == requested_type]
-
-        start, end = parse_date_range(structured_cmd.dict())
+        target, rng = structured_cmd.target, structured_cmd.range
+        contains = target.contains if target else None
+        span = _span(rng, target)
+        if span is None:
+            return False
+        start, end = span
         if not start or not end:
-            all_dates = [datetime.fromisoformat(e['date']).date() for e in entries if e.get('date')]
-            if all_dates:
-                start = min(all_dates)
-                end = max(all_dates)
-                print(f"DEBUG: No specific range provided. Interpreting as full data span: {start} to {end}")
-            else:
-                print("DEBUG: No dates found in entries")
-                return
+            # The full data span comes from the rollup (or the text index for
+            # contains), without loading the entries.
+            first, last = query.bounds(target, rng, query.TRACKER_TYPES)
+            if first is None:
+                print('No entries found.')
+                return True
+            start, end = start or first, end or last
+            metrics.debug(f"No specific range provided. Interpreting as full data span: {start} to {end}")
+        if verbose:
+            entries = list(query.records(target, (start, end), query.TRACKER_TYPES))
+        else:
+            # Non-verbose output only needs per-day totals, which the storage
+            # rollup answers without reading raw entries.
+            entries = tracker_domain.daily_totals(start, end, type_=target.type if target else None,
+                                                  contains=contains)
+        if not entries and contains:
+            print('No entries found.')
+            return True
 
-        summarize_entries(entries, start, end, verbose=verbose)
-        return
+        from caltrack.summary import summarize_entries, summarize_daily_totals
+        if verbose:
+            summarize_entries(entries, start, end, verbose=True)
+        else:
+            summarize_daily_totals(entries, start, end)
+        return True
 
     if action in ('show_weight', 'read_weight', 'list_weight'):
-        weights = weight_domain.list_weights()
+        span = _span(structured_cmd.range)
+        if span is None:
+            return False
+        start, end = span
+        fmt = structured_cmd.format or 'daily'
+        window = weight_domain.MA_WINDOWS.get(fmt)
+        # A moving average at `start` needs the days leading up to it too.
+        lookback = start - timedelta(days=window - 1) if window and start else start
+        weights = weight_domain.list_weights(lookback, end)
         if not weights:
             print('No weight records found.')
-            return
+            return True
+        period = weight_domain.STATS_PERIODS.get(fmt)
+        if period:
+            label = 'Week of' if period == 'week' else 'Date'
+            print(f"{label:<12} {'Min':>7} {'Mean':>7} {'Max':>7} {'N':>4}")
+            for d, lo, mean, hi, n in weight_domain.downsample(weights, period):
+                print(f"{d.isoformat():<12} {lo:>7.2f} {mean:>7.2f} {hi:>7.2f} {n:>4}")
+            return True
+        if window:
+            label = fmt.upper()
+            print(f"{'Date':<12} {'Weight(kg)':>10} {label:>8}")
+            for d, kg, avg in weight_domain.moving_average(weights, window):
+                if start and d < start:
+                    continue
+                print(f"{d.isoformat():<12} {kg:>10.2f} {avg:>8.2f}")
+            return True
         print(f"{'Date':<12} {'Weight(kg)':>10}  ID")
         for w in weights:
             d = datetime.fromisoformat(w['ts']).date().isoformat()
             print(f"{d:<12} {w['kg']:>10.2f}  {w['id']}")
-        return
+        return True
 
     print(f"Unrecognized or unsupported action: {action}")
+    return False
+
+def _read_batch_lines(source):
+    stream = sys.stdin if source == '-' else open(source, 'r')
+    try:
+        return [line.strip() for line in stream if line.strip() and not line.lstrip().startswith('#')]
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+def _parse_one(text, use_cache):
+    try:
+        return parse_command(text, use_cache=use_cache), None
+    except Exception as e:
+        return None, e
+
+def run_batch(source, verbose=False, use_cache=True, assume_yes=False):
+    """Parse every line of source concurrently, then apply them in order in one storage transaction.
+
+    Returns the number of lines that failed.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    lines = _read_batch_lines(source)
+    workers = max(1, int(config.get("batch_workers", DEFAULT_BATCH_WORKERS)))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        parsed = list(pool.map(lambda text: _parse_one(text, use_cache), lines))
+
+    failed = 0
+    with storage.transaction():
+        for n, (text, (cmd, error)) in enumerate(zip(lines, parsed), start=1):
+            print(f"--- [{n}] {text}")
+            if error is not None:
+                print(f"✘ [{n}] parse failed: {error}")
+                failed += 1
+                continue
+            try:
+                ok = execute(cmd, verbose=verbose, interactive=False, assume_yes=assume_yes)
+            except Exception as e:
+                print(f"✘ [{n}] failed: {e}")
+                ok = False
+            if not ok:
+                failed += 1
+    print(f"Batch finished: {len(lines) - failed} succeeded, {failed} failed.")
+    return failed
+
+def _needs_prompt(cmd, assume_yes):
+    """Whether execute() would ask the user something before carrying out cmd."""
+    action = (cmd.action or '').lower().replace(' ', '_')
+    if action == 'delete':
+        return not assume_yes and not (cmd.target and cmd.target.id)
+    return action in ('add', 'add_food', 'consume') and bool(cmd.entries and cmd.needs_confirmation)
+
+def _confirm_here(cmd):
+    """Ask cmd's questions at this terminal; returns False when the user declined (or it's invalid)."""
+    if cmd.entries and cmd.needs_confirmation:
+        for e in cmd.entries:
+            e.date = confirm_date(e.date.isoformat())
+        cmd.needs_confirmation = False
+        return True
+    resolved = _delete_scope(cmd)
+    return resolved is not None and _confirm_delete(resolved[3])
+
+def _forward(command_input, verbose, use_cache, assume_yes, profile=False):
+    """Hand the command to a running `caltrack serve`; returns False if there is none.
+
+    The daemon never prompts. At a terminal it is asked to parse the
+    command first; anything execute() would ask about is asked here and
+    the command is then sent already confirmed, so running the daemon
+    doesn't change what the user sees.
+    """
+    from caltrack import server
+    from caltrack.local_parser import LocalCommand
+    request = {"input": command_input, "verbose": verbose, "use_cache": use_cache,
+               "yes": assume_yes, "profile": profile, "debug": metrics.debug_enabled()}
+    with metrics.timer("cli.forward"):
+        if sys.stdin.isatty():
+            reply = server.forward({"parse": command_input, "use_cache": use_cache,
+                                    "debug": metrics.debug_enabled()})
+            if reply is None:
+                return False
+            if not reply["ok"]:
+                print(reply["output"], end="")
+                return True
+            cmd = LocalCommand(reply["command"])
+            if _needs_prompt(cmd, assume_yes):
+                if not _confirm_here(cmd):
+                    return True
+                request["yes"] = True
+            del request["input"]
+            request["command"] = json.loads(json.dumps(cmd.model_dump(), default=date.isoformat))
+        reply = server.forward(request)
+    if reply is None:
+        return False
+    print(reply["output"], end="")
+    return True
+
+def _run(args, flags, verbose, use_cache, assume_yes, profile):
+    if args and args[0] == 'import':
+        from caltrack import importer
+        sys.exit(importer.main([arg for arg in args[1:] if arg not in flags]))
+
+    if '--batch' in args:
+        i = args.index('--batch')
+        if i + 1 >= len(args):
+            print('Usage: caltrack --batch FILE|- [--verbose] [--no-cache] [--yes] [--profile] [--debug]')
+            sys.exit(1)
+        failed = run_batch(args[i + 1], verbose=verbose, use_cache=use_cache, assume_yes=assume_yes)
+        sys.exit(1 if failed else 0)
+
+    command_input = ' '.join(arg for arg in args if arg not in flags)
+
+    if not command_input:
+        print('Usage: caltrack "<command>" [--verbose] [--no-cache] [--yes] [--local] [--profile] [--debug]')
+        print('       caltrack --batch FILE|- [--verbose] [--no-cache] [--yes] [--profile] [--debug]')
+        print('       caltrack import FILE|- [--format csv|ndjson] [--dry-run] [--profile]')
+        print('       caltrack serve')
+        sys.exit(1)
+
+    # A running daemon already has everything loaded; --local skips it.
+    if '--local' not in args:
+        try:
+            if _forward(command_input, verbose, use_cache, assume_yes, profile):
+                return
+        except (ConnectionError, ValueError) as e:
+            print(f"ERROR: {e}")
+            return
+
+    try:
+        structured_cmd = parse_command(command_input, use_cache=use_cache)
+    except Exception as e:
+        print(f"ERROR: {e}")
+        return
+
+    metrics.debug(f"Structured LLM response: {structured_cmd}")
+    with metrics.timer("cli.execute"):
+        execute(structured_cmd, verbose=verbose, assume_yes=assume_yes)
+
+def main():
+    flags = {'--verbose', '--no-cache', '--yes', '--local', '--profile', '--debug'}
+    verbose = '--verbose' in sys.argv
+    use_cache = '--no-cache' not in sys.argv
+    assume_yes = '--yes' in sys.argv
+    profile = '--profile' in sys.argv
+    args = sys.argv[1:]
+
+    if args and args[0] == 'serve':
+        from caltrack import server
+        server.serve()
+        return
+
+    if '--debug' in args:
+        os.environ['CALTRACK_DEBUG'] = 'on'
+    metrics_file = metrics.metrics_path()
+    metrics.enable(profile or metrics_file is not None)
+    started = time.perf_counter()
+    try:
+        _run(args, flags, verbose, use_cache, assume_yes, profile)
+    finally:
+        if metrics.enabled():
+            elapsed = time.perf_counter() - started
+            if profile:
+                metrics.print_report(elapsed)
+            if metrics_file:
+                metrics.write(metrics_file, command=' '.join(a for a in args if a not in flags),
+                              total_ms=round(elapsed * 1000, 3))
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,77 @@
+import io
+import os
+import subprocess
+import sys
+import pytest
+from caltrack import cli, server
+
+RANGE_DELETE = {"action": "delete", "target": {"type": "food"}, "range": {"value": "2024-01-01 to 2024-01-07"}}
+
+@pytest.fixture
+def daemon(monkeypatch):
+    """A listening daemon that parses every input to `parsed` and records what it's sent."""
+    sent = []
+    state = {"parsed": RANGE_DELETE}
+
+    def forward(request):
+        sent.append(request)
+        if "parse" in request:
+            return {"ok": True, "output": "", "command": state["parsed"]}
+        return {"ok": True, "output": "done\n"}
+
+    monkeypatch.setattr(server, "forward", forward)
+    monkeypatch.setattr("sys.stdin", io.StringIO())
+    monkeypatch.setattr("sys.stdin.isatty", lambda: True)
+    return sent, state
+
+def test_range_delete_is_confirmed_at_the_terminal(daemon, monkeypatch, capsys):
+    sent, _ = daemon
+    monkeypatch.setattr("builtins.input", lambda prompt: "y")
+    assert cli._forward("delete food last week", False, True, False)
+    assert sent[-1]["yes"] is True and sent[-1]["command"]["action"] == "delete"
+    assert "input" not in sent[-1]
+    assert capsys.readouterr().out == "done\n"
+
+def test_declined_delete_is_not_sent(daemon, monkeypatch, capsys):
+    sent, _ = daemon
+    monkeypatch.setattr("builtins.input", lambda prompt: "n")
+    assert cli._forward("delete food last week", False, True, False)
+    assert [r for r in sent if "parse" not in r] == []
+    assert "Aborted by user." in capsys.readouterr().out
+
+def test_date_confirmation_happens_before_forwarding(daemon, monkeypatch):
+    sent, state = daemon
+    state["parsed"] = {"action": "add_food", "needs_confirmation": True, "entries": [
+        {"date": "2024-01-05", "meal": "lunch", "description": "soup", "kcal": 300}]}
+    answers = iter(["n", "2024-01-04"])
+    monkeypatch.setattr("builtins.input", lambda prompt: next(answers))
+    assert cli._forward("had soup for lunch on friday", False, True, False)
+    command = sent[-1]["command"]
+    assert command["needs_confirmation"] is False
+    assert command["entries"][0]["date"] == "2024-01-04"
+
+def test_piped_input_is_forwarded_unparsed(daemon, monkeypatch):
+    sent, _ = daemon
+    monkeypatch.setattr("sys.stdin.isatty", lambda: False)
+    assert cli._forward("delete food last week", False, True, False)
+    assert sent == [{"input": "delete food last week", "verbose": False, "use_cache": True,
+                     "yes": False, "profile": False, "debug": False}]
+
+YES_SCRIPT = """
+import sys, builtins
+from caltrack import cli
+from caltrack.local_parser import LocalCommand
+cli.parse_command = lambda text, use_cache=True: LocalCommand(
+    {"action": "delete", "range": {"type": "absolute", "value": "2024-01-01 to 2024-01-07"}})
+def no_prompt(prompt):
+    raise AssertionError(f"prompted: {prompt}")
+builtins.input = no_prompt
+sys.argv = ["caltrack", "delete everything from that week", "--yes", "--local"]
+cli.main()
+"""
+
+def test_yes_skips_the_prompt_for_a_single_command(tmp_path):
+    env = dict(os.environ, HOME=str(tmp_path))
+    proc = subprocess.run([sys.executable, "-c", YES_SCRIPT], env=env, capture_output=True, text=True)
+    assert proc.returncode == 0, proc.stderr
+    assert "deleted 0 entries from 2024-01-01 to 2024-01-07" in proc.stdout
@@ -0,0 +1,37 @@
+import os
+import subprocess
+import sys
+
+# Cold-start budget for importing the CLI, in milliseconds. Override with
+# CALTRACK_STARTUP_BUDGET_MS on slow machines.
+STARTUP_BUDGET_MS = float(os.environ.get("CALTRACK_STARTUP_BUDGET_MS", 150))
+
+# Modules that only the LLM, fallback date parsing or large summaries need.
+HEAVY_MODULES = ("openai", "pydantic", "dateutil", "numpy")
+
+def _importtime(args, home):
+    """Run python -X importtime with args; returns {module: cumulative_us}."""
+    env = dict(os.environ, HOME=str(home))
+    proc = subprocess.run([sys.executable, "-X", "importtime", *args],
+                          env=env, capture_output=True, text=True, check=True)
+    times = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        times[name.strip()] = int(cumulative)
+    return times
+
+def _heavy(times):
+    return sorted(m for m in times if m.split(".")[0] in HEAVY_MODULES)
+
+def test_cli_import_is_light(tmp_path):
+    times = _importtime(["-c", "import caltrack.cli"], tmp_path)
+    assert _heavy(times) == []
+    assert times["caltrack.cli"] / 1000 < STARTUP_BUDGET_MS
+
+def test_local_commands_skip_heavy_modules(tmp_path):
+    for command in (["log", "weight", "80"], ["drank", "500", "ml", "water"],
+                    ["show", "weight"], ["show", "everything", "today"]):
+        times = _importtime(["-m", "caltrack.cli", *command], tmp_path)
+        assert _heavy(times) == [], command
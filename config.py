@@ -0,0 +1,21 @@
+import os
+import json
+from pathlib import Path
+
+CONFIG_FILE = Path.home() / ".caltrack" / "config.json"
+
+def _file_config() -> dict:
+    if not CONFIG_FILE.exists():
+        return {}
+    try:
+        with CONFIG_FILE.open("r") as f:
+            return json.load(f)
+    except (json.JSONDecodeError, OSError):
+        return {}
+
+def get(key: str, default=None):
+    """Look up a setting: CALTRACK_<KEY> in the environment wins over ~/.caltrack/config.json."""
+    env = os.getenv(f"CALTRACK_{key.upper()}")
+    if env is not None:
+        return env
+    return _file_config().get(key, default)
@@ -1,5 +1,5 @@
 import json
-from caltrack.storage.journal import read_all_records
+from caltrack.storage.backend import read_all_records
 
 def main():
     records = read_all_records()
@@ -32,7 +32,7 @@ if __name__ == "__main__":
         "ts": datetime.now().isoformat(),
         "kg": 70.5
     }
-    from caltrack.storage.journal import append_record
+    from caltrack.storage.backend import append_record
     append_record(weight_rec)
     print(f"✔ Added weight entry (id={weight_id})")
 
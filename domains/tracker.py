@@ -1,7 +1,12 @@
 import uuid
 from datetime import date
-from typing import Dict, Any, List
-from caltrack.storage.journal import append_record, read_all_records, _rewrite_all_records
+from typing import Dict, Any, List, Optional, Iterable
+from caltrack.storage.backend import (
+    append_record, read_range, read_record, replace_record, remove_record,
+    delete_records, update_records, read_daily_totals, search,
+)
+from caltrack.storage.rollup import build as build_totals
+from caltrack.storage.textindex import matches as text_matches
 
 def _base_rec(id: str, d: date, type_: str, description: str) -> Dict[str, Any]:
     return {
@@ -29,27 +34,114 @@ def add_fluid(id: str, d: date, description: str, volume_ml: int) -> Dict[str, A
     append_record(rec)
     return rec
 
-def list_entries() -> List[Dict[str, Any]]:
-    records = read_all_records()
-    return [r for r in records if r.get('type') in ('food', 'activity', 'fluid')]
+TRACKER_TYPES = ('food', 'activity', 'fluid')
+
+def list_entries(start: Optional[date] = None, end: Optional[date] = None,
+                 type_: Optional[str] = None, contains: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Tracker entries in [start, end] as compact read-only records (see storage.records).
+
+    With contains, only entries whose description matches it, looked up in
+    the text index.
+    """
+    if type_ and type_ not in TRACKER_TYPES:
+        return []
+    types = (type_,) if type_ else TRACKER_TYPES
+    if contains:
+        return search(contains, start, end, types, packed=True)
+    return read_range(start, end, types, packed=True)
+
+def daily_totals(start: Optional[date] = None, end: Optional[date] = None,
+                 type_: Optional[str] = None, contains: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+    """Per-day totals keyed by ISO date, from the storage rollup rather than raw entries.
+
+    The rollup has no per-description totals, so with contains they are
+    summed from the matching entries instead.
+    """
+    if contains:
+        return build_totals(list_entries(start, end, type_, contains))
+    days = read_daily_totals(start, end)
+    if not type_:
+        return days
+    if type_ not in TRACKER_TYPES:
+        return {}
+    out = {}
+    for key, day in days.items():
+        if not day['counts'].get(type_):
+            continue
+        only = {"counts": {type_: day['counts'][type_]}, "food": 0, "activity": 0,
+                "fluids_ml": 0, "meals": {}, "fluids": {}}
+        if type_ == 'food':
+            only.update(food=day['food'], meals=day['meals'])
+        elif type_ == 'activity':
+            only.update(activity=day['activity'])
+        else:
+            only.update(fluids_ml=day['fluids_ml'], fluids=day['fluids'])
+        out[key] = only
+    return out
 
 def update_entry(entry_id: str, changes: Dict[str, Any]) -> Dict[str, Any]:
-    records = read_all_records()
-    updated = None
-    for r in records:
-        if r.get('id') == entry_id:
-            r.update(changes)
-            updated = r
-            break
-    if updated:
-        _rewrite_all_records(records)
-        return updated
-    else:
+    rec = read_record(entry_id)
+    if rec is None:
         raise KeyError(f"Entry {entry_id} not found")
+    rec.update(changes)
+    return replace_record(entry_id, rec)
 
 def delete_entry(entry_id: str):
-    records = read_all_records()
-    new_records = [r for r in records if r.get('id') != entry_id]
-    if len(new_records) == len(records):
+    if remove_record(entry_id) is None:
         raise KeyError(f"Entry {entry_id} not found")
-    _rewrite_all_records(new_records)
+
+def _entry_filter(ids: Optional[Iterable[str]] = None, start: Optional[date] = None,
+                  end: Optional[date] = None, type_: Optional[str] = None,
+                  contains: Optional[str] = None):
+    ids = set(ids) if ids is not None else None
+
+    def match(r: Dict[str, Any]) -> bool:
+        if r.get('type') not in TRACKER_TYPES:
+            return False
+        if ids is not None and r.get('id') not in ids:
+            return False
+        if type_ and r.get('type') != type_:
+            return False
+        if start or end:
+            d = date.fromisoformat(r['date'][:10])
+            if (start and d < start) or (end and d > end):
+                return False
+        if contains and not text_matches(contains, r.get('description', '')):
+            return False
+        return True
+    return match
+
+def _narrow(ids, start, end, type_, contains):
+    """Use the text index to cut a contains filter down to known ids and the days they span.
+
+    Returns None when nothing matches.
+    """
+    if not contains:
+        return ids, start, end
+    hits = list_entries(start, end, type_, contains)
+    if not hits:
+        return None
+    found = {r['id'] for r in hits}
+    ids = found if ids is None else set(ids) & found
+    days = [date.fromisoformat(r['date'][:10]) for r in hits]
+    return ids, min(days), max(days)
+
+def delete_entries(ids: Optional[Iterable[str]] = None, start: Optional[date] = None,
+                   end: Optional[date] = None, type_: Optional[str] = None,
+                   contains: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Delete all entries matching the filters with a single journal rewrite."""
+    narrowed = _narrow(ids, start, end, type_, contains)
+    if narrowed is None:
+        return []
+    ids, start, end = narrowed
+    return delete_records(_entry_filter(ids, start, end, type_, contains), start, end)
+
+def update_entries(changes: Dict[str, Any], ids: Optional[Iterable[str]] = None,
+                   start: Optional[date] = None, end: Optional[date] = None,
+                   type_: Optional[str] = None, contains: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Apply the same changes to all matching entries with a single journal rewrite."""
+    narrowed = _narrow(ids, start, end, type_, contains)
+    if narrowed is None:
+        return []
+    ids, start, end = narrowed
+    return update_records(_entry_filter(ids, start, end, type_, contains), changes, start, end)
@@ -1,7 +1,9 @@
 import uuid
-from datetime import datetime
-from typing import Dict, Any, List
-from caltrack.storage.journal import append_record, read_all_records, _rewrite_all_records
+from collections import deque
+from datetime import date, datetime, timedelta
+from typing import Dict, Any, List, Optional, Tuple
+from caltrack import metrics
+from caltrack.storage.backend import append_record, read_weights, read_record, replace_record, remove_record
 
 def _base_rec(id: str, ts: datetime, kg: float) -> Dict[str, Any]:
     return {
@@ -16,31 +18,75 @@ def add(ts: datetime, kg: float) -> Dict[str, Any]:
     append_record(rec)
     return rec
 
-def list_weights() -> List[Dict[str, Any]]:
-    records = read_all_records()
-    weights = [r for r in records if r.get('type') == 'weight']
-    print(f"DEBUG: Found {len(weights)} weight records")
+def list_weights(start: Optional[date] = None, end: Optional[date] = None) -> List[Dict[str, Any]]:
+    weights = read_weights(start, end, packed=True)
+    metrics.debug(f"Found {len(weights)} weight records")
     return weights
 
+MA_WINDOWS = {"ma3": 3, "ma5": 5, "ma7": 7}
+STATS_PERIODS = {"daily_stats": "day", "weekly_stats": "week"}
+
+def daily_means(weights: List[Dict[str, Any]]) -> List[Tuple[date, float]]:
+    """Collapse multiple weigh-ins per day into one mean per day, sorted by date."""
+    totals: Dict[date, List[float]] = {}
+    for w in weights:
+        d = datetime.fromisoformat(w['ts']).date()
+        acc = totals.setdefault(d, [0.0, 0])
+        acc[0] += w['kg']
+        acc[1] += 1
+    return [(d, kg / n) for d, (kg, n) in sorted(totals.items())]
+
+def _bucket(d: date, period: str) -> date:
+    return d - timedelta(days=d.weekday()) if period == 'week' else d
+
+def downsample(weights: List[Dict[str, Any]], period: str = 'day') -> List[Tuple[date, float, float, float, int]]:
+    """Per-day or per-week (weeks start on Monday) (start, min, mean, max, count) rows, sorted by date.
+
+    For long histories: a year of daily weigh-ins is 52 weekly rows.
+    """
+    buckets: Dict[date, List[float]] = {}
+    for w in weights:
+        b = _bucket(datetime.fromisoformat(w['ts']).date(), period)
+        acc = buckets.get(b)
+        if acc is None:
+            buckets[b] = [w['kg'], w['kg'], w['kg'], 1]
+        else:
+            acc[0] = min(acc[0], w['kg'])
+            acc[1] += w['kg']
+            acc[2] = max(acc[2], w['kg'])
+            acc[3] += 1
+    return [(b, lo, total / n, hi, n) for b, (lo, total, hi, n) in sorted(buckets.items())]
+
+def moving_average(weights: List[Dict[str, Any]], window: int) -> List[Tuple[date, float, float]]:
+    """Trailing moving average over `window` calendar days, as (day, daily mean, average) rows.
+
+    Days without a weigh-in are gaps rather than zeros: each average is over
+    the days that do have data within the window. A running sum over a deque
+    keeps this O(n) in the number of days.
+    """
+    rows = []
+    in_window = deque()
+    running = 0.0
+    for d, kg in daily_means(weights):
+        in_window.append((d, kg))
+        running += kg
+        while (d - in_window[0][0]).days >= window:
+            running -= in_window.popleft()[1]
+        rows.append((d, kg, running / len(in_window)))
+    return rows
+
 def update(entry_id: str, kg: float) -> Dict[str, Any]:
-    records = read_all_records()
-    updated = None
-    for r in records:
-        if r.get('id') == entry_id and r.get('type') == 'weight':
-            r['kg'] = kg
-            updated = r
-            break
-    if updated:
-        _rewrite_all_records(records)
-        print(f"DEBUG: Updated weight entry {entry_id}")
-        return updated
-    else:
+    rec = read_record(entry_id)
+    if rec is None or rec.get('type') != 'weight':
         raise KeyError(f"Weight entry {entry_id} not found")
+    rec['kg'] = kg
+    replace_record(entry_id, rec)
+    metrics.debug(f"Updated weight entry {entry_id}")
+    return rec
 
 def delete(entry_id: str):
-    records = read_all_records()
-    new_records = [r for r in records if not (r.get('id') == entry_id and r.get('type') == 'weight')]
-    if len(new_records) == len(records):
+    rec = read_record(entry_id)
+    if rec is None or rec.get('type') != 'weight':
         raise KeyError(f"Weight entry {entry_id} not found")
-    _rewrite_all_records(new_records)
-    print(f"DEBUG: Deleted weight entry {entry_id}")
+    remove_record(entry_id)
+    metrics.debug(f"Deleted weight entry {entry_id}")
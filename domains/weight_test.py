@@ -0,0 +1,58 @@
+import os
+import subprocess
+import sys
+from datetime import date
+import pytest
+from caltrack.domains import weight
+
+def _w(ts, kg):
+    return {"id": ts, "type": "weight", "ts": ts, "kg": kg}
+
+WEIGHTS = [
+    _w("2024-01-01T07:00:00", 80.0), _w("2024-01-01T21:00:00", 81.0),  # daily mean 80.5
+    _w("2024-01-02T07:00:00", 80.0),
+    # no weigh-in on the 3rd
+    _w("2024-01-04T07:00:00", 79.0),
+    _w("2024-01-08T07:00:00", 78.0),  # a Monday
+    _w("2024-01-09T07:00:00", 79.0),
+]
+
+def test_moving_average_is_over_the_days_with_data_in_the_window():
+    rows = weight.moving_average(WEIGHTS, 3)
+    assert [d.isoformat() for d, _, _ in rows] == ["2024-01-01", "2024-01-02", "2024-01-04",
+                                                    "2024-01-08", "2024-01-09"]
+    assert [kg for _, kg, _ in rows] == [80.5, 80.0, 79.0, 78.0, 79.0]
+    assert [avg for _, _, avg in rows] == pytest.approx([80.5, 80.25, 79.5, 78.0, 78.5])
+
+def test_downsample_daily_and_weekly():
+    assert weight.downsample(WEIGHTS, 'day')[0] == (date(2024, 1, 1), 80.0, 80.5, 81.0, 2)
+    assert weight.downsample(WEIGHTS, 'week') == [
+        (date(2024, 1, 1), 79.0, pytest.approx(80.0), 81.0, 4),  # Mon 1st - Sun 7th
+        (date(2024, 1, 8), 78.0, 78.5, 79.0, 2),
+    ]
+
+LOOKBACK_SCRIPT = """
+from datetime import datetime
+from caltrack import cli
+from caltrack.domains import weight
+from caltrack.models import Command, Range
+for ts, kg in [("2024-01-01T07:00", 80.0), ("2024-01-02T07:00", 82.0), ("2024-01-03T07:00", 84.0),
+               ("2024-01-04T07:00", 86.0)]:
+    weight.add(datetime.fromisoformat(ts), kg)
+for fmt in ("ma3", "weekly_stats"):
+    cli.execute(Command(action="read_weight", format=fmt,
+                        range=Range(type="absolute", value="2024-01-03 to 2024-01-04")))
+"""
+
+def test_read_weight_ma_looks_back_before_the_range(tmp_path):
+    env = dict(os.environ, HOME=str(tmp_path))
+    proc = subprocess.run([sys.executable, "-c", LOOKBACK_SCRIPT], env=env, capture_output=True, text=True)
+    assert proc.returncode == 0, proc.stderr
+    assert proc.stdout.splitlines() == [
+        "Date         Weight(kg)      MA3",
+        # The 3rd averages the 1st-3rd, though only the 3rd-4th are shown.
+        "2024-01-03        84.00    82.00",
+        "2024-01-04        86.00    84.00",
+        "Week of          Min    Mean     Max    N",
+        "2024-01-01     84.00   85.00   86.00    2",
+    ]
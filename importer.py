@@ -0,0 +1,229 @@
+"""Bulk import of food, activity, fluid and weight history from CSV or NDJSON exports.
+
+    caltrack import FILE|- [--format csv|ndjson] [--batch-size 5000] [--dry-run]
+
+Rows are read as a stream and handled a batch at a time, so memory stays
+flat however long the export is, apart from the set of ids seen (needed to
+de-duplicate) and a count per distinct id-less row. Each row needs the fields of its models.py entry type;
+`type` may be omitted when the fields make it obvious (kcal_burned is an
+activity, volume_ml a fluid, kg a weight, kcal a food). Weights take `ts`
+or `date`. Rows without an id get one derived from their content and from
+how many identical rows came before them in the export, so importing the
+same export twice adds nothing the second time, while repeated rows (three
+250 ml waters on one day) are all kept.
+"""
+import sys
+import csv
+import json
+import time
+import hashlib
+import argparse
+from itertools import islice
+from datetime import datetime, time as dtime
+from typing import Dict, Iterable, Iterator, List, Optional
+from caltrack import metrics
+from caltrack.storage import backend as storage
+
+DEFAULT_BATCH_SIZE = 5000
+MAX_REPORTED_ERRORS = 20
+
+FORMATS = ('csv', 'ndjson')
+
+def _format_of(source: str, fmt: Optional[str]) -> str:
+    if fmt:
+        return fmt
+    if source.endswith('.csv'):
+        return 'csv'
+    if source.endswith(('.ndjson', '.jsonl', '.json')):
+        return 'ndjson'
+    raise ValueError(f"Can't tell the format of {source}; pass --format csv|ndjson")
+
+def read_rows(stream, fmt: str) -> Iterator[tuple]:
+    """Yield (line number, row) pairs from an open CSV or NDJSON stream, skipping blank lines."""
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for n, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield n, json.loads(line)
+        except json.JSONDecodeError as e:
+            yield n, e
+
+def _type_of(row: Dict) -> Optional[str]:
+    t = row.get('type')
+    if t:
+        return str(t).lower()
+    for field, type_ in (('kcal_burned', 'activity'), ('volume_ml', 'fluid'), ('kg', 'weight'), ('kcal', 'food')):
+        if row.get(field) not in (None, ''):
+            return type_
+    return None
+
+def _content_id(row: Dict, type_: str, repeats: Dict[str, int]) -> str:
+    """An id from the row's content and its position among identical rows seen so far (counted in repeats)."""
+    content = [type_] + [row.get(k) for k in ('date', 'ts', 'meal', 'description', 'kcal',
+                                              'kcal_burned', 'volume_ml', 'kg')]
+    first = hashlib.blake2b(json.dumps(content, default=str).encode(), digest_size=8).hexdigest()
+    n = repeats.get(first, 0)
+    repeats[first] = n + 1
+    if n == 0:
+        return first
+    return hashlib.blake2b(json.dumps(content + [n], default=str).encode(), digest_size=8).hexdigest()
+
+def _prepare(row: Dict, repeats: Dict[str, int]):
+    """The type and cleaned-up fields of a raw row (changed in place when possible), ready for validation."""
+    values = row.values()
+    if '' in values or None in values or None in row:
+        row = {k: v for k, v in row.items() if k and v not in (None, '')}
+    type_ = _type_of(row)
+    if type_ == 'weight':
+        # WeightEntry validates a day; the record keeps the full ts.
+        ts = str(row.get('ts') or row.get('date') or '').strip()
+        try:
+            parsed = datetime.fromisoformat(ts)
+        except ValueError:
+            # Left to pydantic (which also takes e.g. Unix timestamps); the
+            # record's ts is then midnight of the validated day.
+            row.pop('ts', None)
+            row['date'] = ts
+        else:
+            row['ts'], row['date'] = parsed.isoformat(), parsed.date()
+    if type_ == 'food' and isinstance(row.get('meal'), str):
+        row['meal'] = row['meal'].strip().lower()
+    if 'id' in row:
+        row['id'] = str(row['id'])
+    else:
+        row['id'] = _content_id(row, type_, repeats)
+    return type_, row
+
+def _adapters():
+    from pydantic import TypeAdapter
+    from caltrack.models import FoodEntry, ActivityEntry, FluidEntry, WeightEntry
+    return {
+        'food': TypeAdapter(List[FoodEntry]),
+        'activity': TypeAdapter(List[ActivityEntry]),
+        'fluid': TypeAdapter(List[FluidEntry]),
+        'weight': TypeAdapter(List[WeightEntry]),
+    }
+
+def _record(type_: str, entry, row: Dict) -> Dict:
+    """The journal record for a validated entry, in the field order the domains write."""
+    if type_ == 'weight':
+        ts = row.get('ts') or datetime.combine(entry.date, dtime.min).isoformat()
+        return {"id": entry.id, "type": "weight", "ts": ts, "kg": entry.kg}
+    rec = {"id": entry.id, "date": entry.date.isoformat(), "type": type_, "description": entry.description}
+    if type_ == 'food':
+        rec.update(meal=entry.meal, kcal=entry.kcal)
+    elif type_ == 'activity':
+        rec['kcal_burned'] = entry.kcal_burned
+    else:
+        rec['volume_ml'] = entry.volume_ml
+    return rec
+
+def _validate(adapter, rows: List) -> tuple:
+    """Validate (line, row) pairs in one call; returns (entries with their rows, errors by line)."""
+    from pydantic import ValidationError
+    try:
+        return list(zip(adapter.validate_python([r for _, r in rows]), rows)), {}
+    except ValidationError as e:
+        bad = {}
+        for err in e.errors():
+            i = err['loc'][0]
+            field = '.'.join(str(p) for p in err['loc'][1:])
+            bad.setdefault(i, f"{field}: {err['msg']}" if field else err['msg'])
+    good = [row for i, row in enumerate(rows) if i not in bad]
+    errors = {rows[i][0]: msg for i, msg in bad.items()}
+    if not good:
+        return [], errors
+    return list(zip(adapter.validate_python([r for _, r in good]), good)), errors
+
+class ImportStats:
+    def __init__(self):
+        self.rows = self.imported = self.duplicates = self.invalid = 0
+        self.errors = []
+
+    def error(self, line: int, message: str):
+        self.invalid += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(f"line {line}: {message}")
+
+def import_rows(rows: Iterable, batch_size: int = DEFAULT_BATCH_SIZE, dry_run: bool = False) -> ImportStats:
+    """Validate, de-duplicate and append (line, row) pairs a batch at a time."""
+    stats = ImportStats()
+    adapters = _adapters()
+    seen = storage.read_ids()
+    repeats: Dict[str, int] = {}
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            break
+        stats.rows += len(batch)
+        by_type: Dict[str, list] = {}
+        for line, raw in batch:
+            if not isinstance(raw, dict):
+                stats.error(line, f"not a record: {raw}")
+                continue
+            type_, row = _prepare(raw, repeats)
+            if type_ not in adapters:
+                stats.error(line, f"unknown entry type: {type_}")
+                continue
+            by_type.setdefault(type_, []).append((line, row))
+        records = []
+        with metrics.timer("import.validate"):
+            for type_, typed in by_type.items():
+                valid, errors = _validate(adapters[type_], typed)
+                for line, message in errors.items():
+                    stats.error(line, message)
+                for entry, (_, row) in valid:
+                    if entry.id in seen:
+                        stats.duplicates += 1
+                        continue
+                    seen.add(entry.id)
+                    records.append(_record(type_, entry, row))
+        if records and not dry_run:
+            with metrics.timer("import.write"):
+                storage.append_records(records)
+        stats.imported += len(records)
+    return stats
+
+def import_file(source: str, fmt: Optional[str] = None, batch_size: int = DEFAULT_BATCH_SIZE,
+                dry_run: bool = False) -> ImportStats:
+    """Import a CSV/NDJSON file (or stdin for "-")."""
+    fmt = _format_of(source, fmt) if source != '-' else (fmt or 'ndjson')
+    if source == '-':
+        return import_rows(read_rows(sys.stdin, fmt), batch_size, dry_run)
+    with open(source, 'r', newline='' if fmt == 'csv' else None, encoding='utf-8') as stream:
+        return import_rows(read_rows(stream, fmt), batch_size, dry_run)
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="caltrack import", description=__doc__.splitlines()[0])
+    parser.add_argument("source", help="CSV or NDJSON export, or - for stdin (NDJSON unless --format csv)")
+    parser.add_argument("--format", choices=FORMATS, help="input format (default: from the file extension)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="rows validated and written together")
+    parser.add_argument("--dry-run", action="store_true", help="validate and count without writing")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    try:
+        stats = import_file(args.source, args.format, max(1, args.batch_size), args.dry_run)
+    except (OSError, ValueError) as e:
+        print(f"ERROR: {e}")
+        return 1
+    elapsed = time.perf_counter() - started
+    for message in stats.errors:
+        print(f"✘ {message}")
+    if stats.invalid > len(stats.errors):
+        print(f"✘ ... and {stats.invalid - len(stats.errors)} more invalid rows")
+    verb = "would import" if args.dry_run else "imported"
+    rate = stats.rows / elapsed if elapsed else 0
+    print(f"✔ {verb} {stats.imported} of {stats.rows} rows ({stats.duplicates} duplicates, "
+          f"{stats.invalid} invalid) in {elapsed:.2f}s, {rate:,.0f} rows/s")
+    return 1 if stats.invalid else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,45 @@
+import os
+import json
+import subprocess
+import sys
+
+def _run(args, home):
+    env = dict(os.environ, HOME=str(home))
+    return subprocess.run([sys.executable, *args], env=env, capture_output=True, text=True)
+
+def test_weight_date_pydantic_accepts_but_fromisoformat_rejects(tmp_path):
+    export = tmp_path / "export.ndjson"
+    rows = [
+        {"type": "weight", "date": "2024-01-04", "kg": 80.5},
+        {"type": "weight", "date": "1704412800", "kg": 80.2},  # 2024-01-05 as a Unix timestamp
+        {"type": "weight", "date": "not a date", "kg": 80.0},
+        {"type": "food", "date": "2024-01-05", "meal": "lunch", "description": "soup", "kcal": 300},
+    ]
+    export.write_text("".join(json.dumps(r) + "\n" for r in rows))
+
+    proc = _run(["-m", "caltrack.cli", "import", str(export)], tmp_path)
+    assert proc.returncode == 1, proc.stdout + proc.stderr
+    assert "imported 3 of 4 rows (0 duplicates, 1 invalid)" in proc.stdout
+
+    proc = _run(["-c", "import json\n"
+                       "from caltrack.storage import backend as storage\n"
+                       "print(json.dumps(sorted([r.get('ts') or r['date'], r['type']]"
+                       " for r in storage.read_all_records())))"], tmp_path)
+    assert proc.returncode == 0, proc.stderr
+    assert json.loads(proc.stdout) == [
+        ["2024-01-04T00:00:00", "weight"],
+        ["2024-01-05", "food"],
+        ["2024-01-05T00:00:00", "weight"],
+    ]
+
+def test_identical_rows_without_ids_are_all_imported_once(tmp_path):
+    export = tmp_path / "export.ndjson"
+    water = {"type": "fluid", "date": "2024-01-05", "description": "water", "volume_ml": 250}
+    export.write_text("".join(json.dumps(water) + "\n" for _ in range(3)))
+
+    proc = _run(["-m", "caltrack.cli", "import", str(export)], tmp_path)
+    assert proc.returncode == 0, proc.stdout + proc.stderr
+    assert "imported 3 of 3 rows (0 duplicates, 0 invalid)" in proc.stdout
+
+    proc = _run(["-m", "caltrack.cli", "import", str(export)], tmp_path)
+    assert "imported 0 of 3 rows (3 duplicates, 0 invalid)" in proc.stdout
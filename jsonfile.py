@@ -0,0 +1,54 @@
+import os
+import json
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # no advisory locks on this platform; only threads are serialized
+    fcntl = None
+
+# Small JSON state files under ~/.caltrack (parser stats, the LLM cache) that
+# several processes update: the CLI, `caltrack serve`, cron jobs. update()
+# does the read-modify-write under an exclusive flock on a sibling .lock file
+# and lands the result by rename, so readers never see a partial file and
+# concurrent writers don't lose each other's changes.
+
+_lock = threading.Lock()
+
+def load(path: Path, default=None):
+    try:
+        with path.open("r") as f:
+            return json.load(f)
+    except (json.JSONDecodeError, OSError):
+        return default
+
+@contextmanager
+def _locked(path: Path):
+    with _lock:
+        if fcntl is None:
+            yield
+            return
+        fd = os.open(path.with_suffix(".lock"), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            os.close(fd)
+
+def update(path: Path, change, default=None):
+    """Apply change(data) to the file's contents under the lock and save what it returns.
+
+    change gets the loaded value (default when missing or unreadable) and
+    returns the new value, or None to leave the file as it is.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with _locked(path):
+        new = change(load(path, default))
+        if new is None:
+            return
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        with tmp.open("w") as f:
+            json.dump(new, f)
+        tmp.replace(path)
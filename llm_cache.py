@@ -0,0 +1,71 @@
+import json
+import time
+import hashlib
+import threading
+from pathlib import Path
+from caltrack import config, jsonfile
+
+CACHE_FILE = Path.home() / ".caltrack" / "llm_cache.json"
+DEFAULT_MAX_ENTRIES = 500
+DEFAULT_TTL_SECONDS = 7 * 24 * 3600
+
+# A hit doesn't write the file: the new last-used times are kept here and
+# merged into the file by the next put(), which writes it anyway and is the
+# only place entries are evicted. Expired entries are dropped there too.
+_used = {}
+_lock = threading.Lock()
+
+def normalize(text: str) -> str:
+    return ' '.join(text.casefold().split())
+
+def make_key(user_input: str, today: str, model: str, schema_hash: str) -> str:
+    """Cache key for a parse: normalized text plus everything else that shapes the answer."""
+    raw = json.dumps([normalize(user_input), today, model, schema_hash])
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+def enabled() -> bool:
+    return str(config.get("llm_cache", "on")).lower() not in ("0", "off", "false", "no")
+
+def _max_entries() -> int:
+    return int(config.get("llm_cache_size", DEFAULT_MAX_ENTRIES))
+
+def _ttl() -> float:
+    return float(config.get("llm_cache_ttl", DEFAULT_TTL_SECONDS))
+
+def get(key: str):
+    """Return the cached Command JSON for key, or None if missing or expired."""
+    hit = jsonfile.load(CACHE_FILE, {}).get(key)
+    now = time.time()
+    if hit is None or now - hit['created'] > _ttl():
+        return None
+    with _lock:
+        _used[key] = now
+    return hit['cmd']
+
+def put(key: str, command_json: str):
+    """Store a validated Command JSON, evicting least recently used entries past the size bound."""
+    now = time.time()
+    with _lock:
+        used = dict(_used)
+        _used.clear()
+
+    def change(entries):
+        entries = entries if isinstance(entries, dict) else {}
+        ttl = _ttl()
+        for k in [k for k, e in entries.items() if now - e['created'] > ttl]:
+            del entries[k]
+        for k, t in used.items():
+            if k in entries:
+                entries[k]['used'] = max(entries[k]['used'], t)
+        entries[key] = {"cmd": command_json, "created": now, "used": now}
+        limit = _max_entries()
+        if len(entries) > limit:
+            for stale in sorted(entries, key=lambda k: entries[k]['used'])[:len(entries) - limit]:
+                del entries[stale]
+        return entries
+
+    jsonfile.update(CACHE_FILE, change)
+
+def clear():
+    if CACHE_FILE.exists():
+        CACHE_FILE.unlink()
@@ -2,56 +2,246 @@ import os
 import openai
 import json
 import uuid
+import time
+import random
+import hashlib
+import threading
+from functools import lru_cache
 from datetime import date
+from typing import Optional
 from pydantic import ValidationError
+from caltrack import config, llm_cache, metrics
 from caltrack.models import Command
 
 # Set your OpenAI API key
 openai.api_key = os.getenv("OPENAI_API_KEY")
 
-def call_llm(user_input: str) -> Command:
-    """
-    Call the OpenAI API using function (tool) calling to parse the user input
-    directly into a structured Command object.
+MODEL = "gpt-4-turbo"
+
+DEFAULT_TIMEOUT = 30.0
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF = 0.5
+DEFAULT_BACKOFF_MAX = 8.0
+
+# Failures worth another try; anything else (bad request, auth) is raised at once.
+TRANSIENT_ERRORS = (
+    openai.error.Timeout,
+    openai.error.APIConnectionError,
+    openai.error.RateLimitError,
+    openai.error.ServiceUnavailableError,
+    openai.error.TryAgain,
+)
+
+class LLMClient:
+    """Chat-completion calls over one pooled HTTP session.
+
+    Requests share the session's keep-alive connections for the life of
+    the process, each attempt is bounded by `timeout` seconds, and
+    transient failures are retried up to `retries` times with full-jitter
+    exponential backoff. `api_base` points the client at another
+    OpenAI-compatible endpoint, e.g. a local stand-in for offline load
+    tests.
     """
+    def __init__(self, api_key=None, api_base=None, timeout=DEFAULT_TIMEOUT, retries=DEFAULT_RETRIES,
+                 backoff=DEFAULT_BACKOFF, backoff_max=DEFAULT_BACKOFF_MAX, pool_size=10):
+        import requests
+        self.api_key = api_key or openai.api_key
+        self.api_base = api_base
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def _delay(self, attempt: int) -> float:
+        return random.uniform(0, min(self.backoff_max, self.backoff * 2 ** attempt))
+
+    def chat(self, **kwargs):
+        """openai.ChatCompletion.create with this client's session, timeout and retries."""
+        if self.api_base:
+            kwargs.setdefault("api_base", self.api_base)
+        attempt = 0
+        while True:
+            # The legacy SDK takes its session from a module global; set it
+            # per call so every request goes through the pooled session.
+            openai.requestssession = self.session
+            try:
+                return openai.ChatCompletion.create(api_key=self.api_key, request_timeout=self.timeout, **kwargs)
+            except TRANSIENT_ERRORS as e:
+                if attempt >= self.retries:
+                    raise
+                delay = self._delay(attempt)
+                attempt += 1
+                metrics.count("llm.retries")
+                metrics.debug(f"LLM request failed ({type(e).__name__}), retry {attempt}/{self.retries} in {delay:.2f}s")
+                time.sleep(delay)
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_client() -> LLMClient:
+    """The process-wide client, configured from config.json / CALTRACK_* env vars."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = LLMClient(
+                api_base=config.get("llm_api_base"),
+                timeout=float(config.get("llm_timeout", DEFAULT_TIMEOUT)),
+                retries=int(config.get("llm_retries", DEFAULT_RETRIES)),
+                backoff=float(config.get("llm_backoff", DEFAULT_BACKOFF)),
+                backoff_max=float(config.get("llm_backoff_max", DEFAULT_BACKOFF_MAX)),
+                pool_size=max(10, int(config.get("batch_workers", 8))),
+            )
+        return _client
+
+SYSTEM_PROMPT_TEMPLATE = (
+    "You are CalTrack's command parser.\n"
+    "Your task: Convert user natural language into a valid JSON object matching the Command schema.\n"
+    "Rules:\n"
+    "1. Only return a JSON object, no extra prose or explanations.\n"
+    "2. Always emit 'explicit_time': true if the user mentioned a date/time.\n"
+    "3. Resolve fuzzy date expressions (e.g., 'yesterday', 'next Thursday', 'Thursday before last', 'Wednesday after next') to exact ISO dates (YYYY-MM-DD), using today {today}.\n"
+    "4. When intent is a specific day (e.g., 'yesterday', 'today'), encode as a single-date range (start == end).\n"
+    "5. Support multi-day ranges even if composed of fuzzy start and/or end (e.g., 'from Thursday before last to Wednesday after next').\n"
+    "6. For add actions, decompose multiple items into separate entries.\n"
+    "7. For add actions, estimate missing numeric fields if not given.\n"
+    "8. For add_weight, read_weight, etc., follow the Command schema rules.\n"
+    "9. Never add commentary, apologies, or non-JSON text.\n"
+    "10. Always include required 'id' and type-specific fields to match Command schema validation.\n"
+    "11. For activities, interpret 'consumed' as synonymous with 'burned', and always encode calorie values as negative.\n"
+    "12. For delete actions, support deletion by entry ID, by specific date, or by date range. Always confirm with the user before deleting date-based data.\n"
+    "13. If the user says 'show [type]' or 'show all [type]', interpret as a read action for all records of that type. Do not include 'target.date' or 'range' unless explicitly stated.\n"
+    "14. When the user names what they ate, drank or did in a read or delete ('show everything with oatmeal', 'delete the pizza from last week'), put those words in 'target.contains'.\n"
+    "15. For read_weight, use format 'weekly_stats' or 'daily_stats' when the user asks for weekly or daily min/max/average weights.\n"
+)
+
+TOOL_CHOICE = {"type": "function", "function": {"name": "parse_command"}}
+
+# Per-intent slices of the Command schema: the actions allowed and the
+# fields worth sending. Used when llm_schema=intent and the first word of
+# the input makes the intent unambiguous; otherwise the full schema goes.
+INTENTS = {
+    "add": (("add", "add_weight"), ("action", "entries", "needs_confirmation", "explicit_time")),
+    "read": (("read", "read_weight"), ("action", "target", "range", "format", "explicit_time")),
+    "update": (("update", "update_weight"), ("action", "target", "range", "set", "explicit_time")),
+    "delete": (("delete", "delete_weight"), ("action", "target", "range", "needs_confirmation", "explicit_time")),
+}
+_INTENT_WORDS = {
+    "add": "add", "log": "add", "record": "add", "ate": "add", "had": "add", "drank": "add",
+    "show": "read", "list": "read", "read": "read", "display": "read", "view": "read",
+    "update": "update", "change": "update", "edit": "update", "set": "update", "fix": "update",
+    "delete": "delete", "remove": "delete", "del": "delete", "rm": "delete",
+}
+
+def guess_intent(user_input: str) -> Optional[str]:
+    words = user_input.casefold().split()
+    return _INTENT_WORDS.get(words[0]) if words else None
 
-    system_prompt = (
-        "You are CalTrack's command parser.\n"
-        "Your task: Convert user natural language into a valid JSON object matching the Command schema.\n"
-        "Rules:\n"
-        "1. Only return a JSON object, no extra prose or explanations.\n"
-        "2. Always emit 'explicit_time': true if the user mentioned a date/time.\n"
-        "3. Resolve fuzzy date expressions (e.g., 'yesterday', 'next Thursday', 'Thursday before last', 'Wednesday after next') to exact ISO dates (YYYY-MM-DD), using today {today}.\n"
-        "4. When intent is a specific day (e.g., 'yesterday', 'today'), encode as a single-date range (start == end).\n"
-        "5. Support multi-day ranges even if composed of fuzzy start and/or end (e.g., 'from Thursday before last to Wednesday after next').\n"
-        "6. For add actions, decompose multiple items into separate entries.\n"
-        "7. For add actions, estimate missing numeric fields if not given.\n"
-        "8. For add_weight, read_weight, etc., follow the Command schema rules.\n"
-        "9. Never add commentary, apologies, or non-JSON text.\n"
-        "10. Always include required 'id' and type-specific fields to match Command schema validation.\n"
-        "11. For activities, interpret 'consumed' as synonymous with 'burned', and always encode calorie values as negative.\n"
-        "12. For delete actions, support deletion by entry ID, by specific date, or by date range. Always confirm with the user before deleting date-based data.\n"
-        "13. If the user says 'show [type]' or 'show all [type]', interpret as a read action for all records of that type. Do not include 'target.date' or 'range' unless explicitly stated.\n"
-    ).format(today=date.today().isoformat())
-
-    response = openai.ChatCompletion.create(
-        model="gpt-4-turbo",
-        messages=[
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_input}
-        ],
-        tools=[
-            {
-                "type": "function",
-                "function": {
-                    "name": "parse_command",
-                    "description": "Parse natural language into a structured Command object.",
-                    "parameters": Command.model_json_schema()
-                }
+def _refs(node, found: set):
+    if isinstance(node, dict):
+        ref = node.get("$ref")
+        if isinstance(ref, str) and ref.startswith("#/$defs/"):
+            found.add(ref[len("#/$defs/"):])
+        for v in node.values():
+            _refs(v, found)
+    elif isinstance(node, list):
+        for v in node:
+            _refs(v, found)
+
+def _trim(schema: dict, intent: str) -> dict:
+    actions, fields = INTENTS[intent]
+    props = {k: v for k, v in schema["properties"].items() if k in fields}
+    props["action"] = dict(props["action"], enum=list(actions))
+    trimmed = {k: v for k, v in schema.items() if k not in ("properties", "required", "$defs")}
+    trimmed["properties"] = props
+    trimmed["required"] = [k for k in schema.get("required", []) if k in fields]
+    used = set()
+    _refs(props, used)
+    pending = list(used)
+    while pending:
+        name = pending.pop()
+        nested = set()
+        _refs(schema["$defs"][name], nested)
+        pending.extend(nested - used)
+        used |= nested
+    if used:
+        trimmed["$defs"] = {k: v for k, v in schema["$defs"].items() if k in used}
+    return trimmed
+
+@lru_cache(maxsize=None)
+def command_schema(intent: Optional[str] = None) -> dict:
+    """The Command JSON schema, generated once; trimmed to one intent when given."""
+    schema = Command.model_json_schema()
+    return _trim(schema, intent) if intent else schema
+
+@lru_cache(maxsize=None)
+def schema_hash(intent: Optional[str] = None) -> str:
+    schema = json.dumps(command_schema(intent), sort_keys=True)
+    return hashlib.sha256(schema.encode()).hexdigest()[:16]
+
+@lru_cache(maxsize=None)
+def _tools(intent: Optional[str]) -> list:
+    return [
+        {
+            "type": "function",
+            "function": {
+                "name": "parse_command",
+                "description": "Parse natural language into a structured Command object.",
+                "parameters": command_schema(intent)
             }
-        ],
-        tool_choice={"type": "function", "function": {"name": "parse_command"}}
-    )
+        }
+    ]
+
+@lru_cache(maxsize=4)
+def system_prompt(today: str) -> str:
+    return SYSTEM_PROMPT_TEMPLATE.format(today=today)
+
+def _schema_intent(user_input: str) -> Optional[str]:
+    if str(config.get("llm_schema", "full")).lower() != "intent":
+        return None
+    return guess_intent(user_input)
+
+def call_llm(user_input: str, use_cache: bool = True) -> Command:
+    """
+    Parse the user input into a structured Command, answering from the
+    on-disk cache when the same normalized command was already parsed today.
+    Pass use_cache=False (or set CALTRACK_LLM_CACHE=off) to always ask the LLM.
+    """
+    use_cache = use_cache and llm_cache.enabled()
+    intent = _schema_intent(user_input)
+    key = llm_cache.make_key(user_input, date.today().isoformat(), MODEL, schema_hash(intent))
+    if use_cache:
+        with metrics.timer("llm.cache"):
+            cached = llm_cache.get(key)
+        if cached is not None:
+            metrics.count("llm.cache_hit")
+            with metrics.timer("command.validate"):
+                return Command.model_validate_json(cached)
+    with metrics.timer("llm.call"):
+        cmd = _request_command(user_input, intent)
+    if use_cache:
+        llm_cache.put(key, cmd.model_dump_json())
+    return cmd
+
+def _request_command(user_input: str, intent: Optional[str] = None) -> Command:
+    """
+    Call the OpenAI API using function (tool) calling to parse the user input
+    directly into a structured Command object. With an intent, only that
+    intent's slice of the schema is sent.
+    """
+    with metrics.timer("llm.request"):
+        response = get_client().chat(
+            model=MODEL,
+            messages=[
+                {"role": "system", "content": system_prompt(date.today().isoformat())},
+                {"role": "user", "content": user_input}
+            ],
+            tools=_tools(intent),
+            tool_choice=TOOL_CHOICE
+        )
 
     choice = response['choices'][0]
     message = choice['message']
@@ -63,7 +253,7 @@ def call_llm(user_input: str) -> Command:
         raise ValueError('Tool call missing function or arguments.')
 
     args_str = tool_call['function']['arguments']
-    print("DEBUG raw args:", args_str)
+    metrics.debug(f"raw args: {args_str}")
 
     try:
         args = json.loads(args_str)
@@ -80,7 +270,8 @@ def call_llm(user_input: str) -> Command:
                     entry['kg'] = 0
 
         if 'target' in args and args['target'] is not None:
-            args['target'].setdefault('id', uuid.uuid4().hex[:8])
+            # No made-up id here: execute() treats target.id as "delete this entry".
+            args['target'].setdefault('id', None)
             args['target'].setdefault('contains', '')
     
             # Sanity fallback: ensure date is None if missing
@@ -90,10 +281,11 @@ def call_llm(user_input: str) -> Command:
         action = args.get("action")
         target = args.get("target")
         if action in {"read", "delete"} and target:
-            if not target.get("date") and not args.get("range") and not target.get("type"):
-                raise ValueError("Ambiguous command: missing 'target.date', 'range', or 'type'.")
+            if not target.get("date") and not args.get("range") and not target.get("type") and not target.get("contains"):
+                raise ValueError("Ambiguous command: missing 'target.date', 'range', 'type' or 'contains'.")
 
-        return Command(**args)
+        with metrics.timer("command.validate"):
+            return Command(**args)
 
     except (json.JSONDecodeError, ValidationError) as e:
         raise ValueError(f"Failed to parse Command from LLM: {str(e)}")
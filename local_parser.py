@@ -0,0 +1,274 @@
+import re
+import uuid
+import atexit
+import threading
+from datetime import date, timedelta
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Optional, Tuple
+from caltrack import jsonfile, metrics
+
+STATS_FILE = Path.home() / ".caltrack" / "fastpath_stats.json"
+# Hits and misses are counted in memory and added to STATS_FILE every
+# STATS_FLUSH_EVERY parses and at exit, rather than rewriting it per command.
+STATS_FLUSH_EVERY = 50
+_stats_lock = threading.RLock()
+_unsaved = {"hits": 0, "misses": 0}
+
+# Local grammar for the commands scripts send over and over. Anything that
+# doesn't match exactly is left to the LLM; a miss is always safe, a wrong
+# hit is not, so the patterns are deliberately narrow.
+
+_SHOW = r"(?:show|list|read|display|view)(?:\s+me)?(?:\s+(?:all|my))*"
+
+_READ_WEIGHT = re.compile(_SHOW + r"\s+(?:weights?|weigh-ins?)(?:\s+(daily|weekly|ma3|ma5|ma7))?")
+# "show weights daily" keeps listing every weigh-in; "weekly" is the
+# downsampled view.
+_WEIGHT_FORMATS = {"weekly": "weekly_stats"}
+_READ_TYPE = re.compile(_SHOW + r"\s+(foods?|meals?|fluids?|drinks?|activit(?:y|ies)|exercises?|entries|everything)")
+_DELETE_ID = re.compile(r"(?:delete|remove|del|rm)\s+(?:entry\s+)?(?:id\s*=?\s*)?([0-9a-f]{8})")
+_ADD_WEIGHT = re.compile(
+    r"(?:(?:log|add|record)\s+)?(?:my\s+)?weight(?:\s+(?:is|was|of))?\s+(\d+(?:\.\d+)?)\s*(kg|kgs|kilos?|lbs?|pounds?)?"
+)
+_VOLUME = r"(\d+(?:\.\d+)?)\s*(ml|l|liters?|litres?)"
+# A drink is at most three words ("sparkling water", "oat milk latte"); a
+# longer tail is more likely a second item, which only the LLM can split.
+_FLUID_WORD = r"([a-z]+(?: [a-z]+){0,2})"
+_ADD_FLUID_VOLUME_FIRST = re.compile(r"(?:(?:log|add|drank|had)\s+)?" + _VOLUME + r"\s+(?:of\s+)?" + _FLUID_WORD)
+_ADD_FLUID_NAME_FIRST = re.compile(r"(?:(?:log|add|drank|had)\s+)?" + _FLUID_WORD + r"\s+" + _VOLUME)
+
+# Verbs that must not end up as a fluid description ("log 2 l" is not a drink called "log").
+_NOT_FLUIDS = {'log', 'add', 'drank', 'had', 'ate', 'eat', 'ran', 'run', 'walked', 'burned'}
+# Words that join a second item on ("water and a sandwich", "coffee with milk").
+_CONNECTIVES = {'and', 'then', 'with', 'plus', 'also', 'after', 'before', 'while', 'or'}
+
+_TYPE_WORDS = {
+    'food': 'food', 'foods': 'food', 'meal': 'food', 'meals': 'food',
+    'fluid': 'fluid', 'fluids': 'fluid', 'drink': 'fluid', 'drinks': 'fluid',
+    'activity': 'activity', 'activities': 'activity', 'exercise': 'activity', 'exercises': 'activity',
+}
+
+_MONTH_NAMES = ('january', 'february', 'march', 'april', 'may', 'june', 'july',
+                'august', 'september', 'october', 'november', 'december')
+_MONTH_NUMBERS = {'sept': 9}
+for _n, _name in enumerate(_MONTH_NAMES, start=1):
+    _MONTH_NUMBERS[_name] = _MONTH_NUMBERS[_name[:3]] = _n
+_MONTHS = "(?:" + "|".join(sorted(_MONTH_NUMBERS, key=len, reverse=True)) + ")"
+_MONTH_DAY = re.compile("(" + _MONTHS + r")\s+(\d{1,2})(?:,?\s+(\d{4}))?")
+_DATE_PHRASE = re.compile(
+    r"\s+(?:(?:on|for|from|in)\s+)?("
+    r"today|yesterday|(?:the\s+)?day\s+before\s+yesterday|\d+\s+days?\s+ago"
+    r"|(?:this|last)\s+(?:week|month)|(?:the\s+)?(?:last|past)\s+\d+\s+days"
+    r"|\d{4}-\d{2}-\d{2}(?:\s*(?:to|\.\.)\s*\d{4}-\d{2}-\d{2})?"
+    r"|" + _MONTHS + r"\s+\d{1,2}(?:,?\s+\d{4})?"
+    r")$"
+)
+
+def _resolve_dates(phrase: str, today: date) -> Tuple[date, date]:
+    if phrase == 'today':
+        return today, today
+    if phrase == 'yesterday':
+        d = today - timedelta(days=1)
+        return d, d
+    if phrase.endswith('before yesterday'):
+        d = today - timedelta(days=2)
+        return d, d
+    m = re.fullmatch(r"(\d+)\s+days?\s+ago", phrase)
+    if m:
+        d = today - timedelta(days=int(m.group(1)))
+        return d, d
+    m = re.fullmatch(r"(?:the\s+)?(?:last|past)\s+(\d+)\s+days", phrase)
+    if m:
+        return today - timedelta(days=int(m.group(1)) - 1), today
+    if phrase == 'this week':
+        return today - timedelta(days=today.weekday()), today
+    if phrase == 'last week':
+        monday = today - timedelta(days=today.weekday() + 7)
+        return monday, monday + timedelta(days=6)
+    if phrase == 'this month':
+        return today.replace(day=1), today
+    if phrase == 'last month':
+        last = today.replace(day=1) - timedelta(days=1)
+        return last.replace(day=1), last
+    m = re.fullmatch(r"(\d{4}-\d{2}-\d{2})\s*(?:to|\.\.)\s*(\d{4}-\d{2}-\d{2})", phrase)
+    if m:
+        return date.fromisoformat(m.group(1)), date.fromisoformat(m.group(2))
+    if re.fullmatch(r"\d{4}-\d{2}-\d{2}", phrase):
+        d = date.fromisoformat(phrase)
+        return d, d
+    # Month-name dates ("jan 5", "march 3, 2024"), this year unless one is
+    # given. An impossible day ("may 40") raises ValueError: a miss.
+    m = _MONTH_DAY.fullmatch(phrase)
+    if m:
+        d = date(int(m.group(3) or today.year), _MONTH_NUMBERS[m.group(1)], int(m.group(2)))
+        return d, d
+    raise ValueError(f"unrecognized date: {phrase}")
+
+def _split_date(text: str, today: date):
+    m = _DATE_PHRASE.search(text)
+    if not m:
+        return text, None, None
+    start, end = _resolve_dates(m.group(1), today)
+    return text[:m.start()].strip(), start, end
+
+def _range(start: date, end: date) -> dict:
+    value = start.isoformat() if start == end else f"{start.isoformat()} to {end.isoformat()}"
+    return {"type": "absolute", "value": value}
+
+def _to_kg(value: float, unit: Optional[str]) -> float:
+    if unit and unit.startswith(('lb', 'pound')):
+        return round(value * 0.45359237, 2)
+    return value
+
+def _to_ml(value: float, unit: str) -> int:
+    return int(round(value if unit == 'ml' else value * 1000))
+
+def _match(text: str, today: date) -> Optional[dict]:
+    """Return Command fields for text, or None when it isn't one of the known shapes."""
+    body, start, end = _split_date(text, today)
+    dated = start is not None
+    single_day = dated and start == end
+
+    m = _READ_WEIGHT.fullmatch(body)
+    if m:
+        cmd = {"action": "read_weight", "target": {"type": "weight"}}
+        if m.group(1):
+            cmd["format"] = _WEIGHT_FORMATS.get(m.group(1), m.group(1))
+        if dated:
+            cmd.update(range=_range(start, end), explicit_time=True)
+        return cmd
+
+    m = _READ_TYPE.fullmatch(body)
+    if m:
+        cmd = {"action": "read"}
+        type_ = _TYPE_WORDS.get(m.group(1))
+        if type_:
+            cmd["target"] = {"type": type_}
+        if dated:
+            cmd.update(range=_range(start, end), explicit_time=True)
+        return cmd
+
+    m = _DELETE_ID.fullmatch(body)
+    if m and not dated:
+        return {"action": "delete", "target": {"id": m.group(1)}}
+
+    if dated and not single_day:
+        return None
+    day = start or today
+
+    m = _ADD_WEIGHT.fullmatch(body)
+    if m:
+        entry = {"id": uuid.uuid4().hex[:8], "date": day.isoformat(), "kg": _to_kg(float(m.group(1)), m.group(2))}
+        return {"action": "add", "entries": [entry], "explicit_time": dated}
+
+    m = _ADD_FLUID_VOLUME_FIRST.fullmatch(body)
+    if m:
+        volume, unit, desc = m.groups()
+    else:
+        m = _ADD_FLUID_NAME_FIRST.fullmatch(body)
+        if not m:
+            return None
+        desc, volume, unit = m.groups()
+    words = desc.split()
+    if words[0] in _NOT_FLUIDS or _CONNECTIVES.intersection(words):
+        return None
+    entry = {
+        "id": uuid.uuid4().hex[:8],
+        "date": day.isoformat(),
+        "description": desc.strip(),
+        "volume_ml": _to_ml(float(volume), unit),
+    }
+    return {"action": "add", "entries": [entry], "explicit_time": dated}
+
+def _normalize(text: str) -> str:
+    return ' '.join(text.casefold().split()).rstrip('.!')
+
+def _record(hit: bool):
+    with _stats_lock:
+        _unsaved['hits' if hit else 'misses'] += 1
+        if _unsaved['hits'] + _unsaved['misses'] >= STATS_FLUSH_EVERY:
+            _flush_stats()
+
+def _flush_stats():
+    with _stats_lock:
+        delta = dict(_unsaved)
+        if not delta['hits'] and not delta['misses']:
+            return
+
+        def add(saved):
+            saved = saved if isinstance(saved, dict) else {}
+            return {k: saved.get(k, 0) + delta[k] for k in delta}
+
+        jsonfile.update(STATS_FILE, add)
+        _unsaved.update(hits=0, misses=0)
+
+atexit.register(_flush_stats)
+
+def read_stats() -> dict:
+    """Hit/miss counters for the local parser, plus the resulting hit rate."""
+    stats = {"hits": 0, "misses": 0}
+    saved = jsonfile.load(STATS_FILE, {})
+    with _stats_lock:
+        for key in stats:
+            stats[key] = saved.get(key, 0) + _unsaved[key]
+    total = stats['hits'] + stats['misses']
+    stats['hit_rate'] = stats['hits'] / total if total else 0.0
+    return stats
+
+_COMMAND_DEFAULTS = {
+    "target": None, "entries": None, "needs_confirmation": False,
+    "range": None, "format": None, "set": None, "explicit_time": False,
+}
+_TARGET_DEFAULTS = {"id": None, "date": None, "contains": None, "type": None}
+
+def _dump(value):
+    if isinstance(value, SimpleNamespace):
+        return {k: _dump(v) for k, v in vars(value).items()}
+    if isinstance(value, list):
+        return [_dump(v) for v in value]
+    return value
+
+class LocalCommand(SimpleNamespace):
+    """A models.Command look-alike built from grammar matches.
+
+    It has the same attributes (and model_dump()) that cli.execute reads,
+    so a local hit never imports pydantic; the grammar only ever produces
+    valid field values. to_command() gives the validated model when a
+    caller needs one.
+    """
+    def __init__(self, fields: dict):
+        super().__init__(**{**_COMMAND_DEFAULTS, **fields})
+        if self.target is not None:
+            self.target = SimpleNamespace(**{**_TARGET_DEFAULTS, **self.target})
+        if self.range is not None:
+            self.range = SimpleNamespace(**self.range)
+        if self.entries is not None:
+            self.entries = [SimpleNamespace(**dict(e, date=date.fromisoformat(e['date']))) for e in self.entries]
+
+    def model_dump(self) -> dict:
+        return _dump(self)
+
+    def to_command(self):
+        from caltrack.models import Command
+        return Command(**self.model_dump())
+
+def parse_local(user_input: str, today: Optional[date] = None):
+    """Parse a command without the LLM; returns a LocalCommand or None on a miss."""
+    try:
+        fields = _match(_normalize(user_input), today or date.today())
+    except (ValueError, OverflowError):
+        fields = None
+    if fields is None:
+        return None
+    return LocalCommand(fields)
+
+def parse_command(user_input: str, use_cache: bool = True):
+    """Try the local grammar first and only fall back to call_llm when it can't match."""
+    with metrics.timer("parse.local"):
+        cmd = parse_local(user_input)
+    _record(cmd is not None)
+    metrics.count("parse.local_hit" if cmd is not None else "parse.local_miss")
+    if cmd is not None:
+        return cmd
+    from caltrack.llm_client import call_llm
+    return call_llm(user_input, use_cache=use_cache)
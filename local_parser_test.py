@@ -0,0 +1,41 @@
+from datetime import date
+import pytest
+from caltrack.local_parser import parse_local
+
+TODAY = date(2024, 5, 10)
+
+@pytest.mark.parametrize("text", [
+    "drank 500ml water and ate a sandwich",
+    "had 2 l water then ran for an hour",
+    "log 300 ml coffee with milk and a croissant",
+    "drank 500 ml water, then coffee",
+    "had 250 ml of some very long drink name",
+])
+def test_multi_item_fluid_sentences_go_to_the_llm(text):
+    assert parse_local(text, TODAY) is None
+
+@pytest.mark.parametrize("text, desc, ml", [
+    ("drank 500ml water", "water", 500),
+    ("had 330 ml sparkling water", "sparkling water", 330),
+    ("orange juice 250 ml", "orange juice", 250),
+])
+def test_fluid_fast_path(text, desc, ml):
+    entry = parse_local(text, TODAY).entries[0]
+    assert (entry.description, entry.volume_ml) == (desc, ml)
+
+@pytest.mark.parametrize("text", [
+    "water 500ml on may 40",
+    "water 500ml on feb 30",
+    "water 500ml on march 0",
+    "show fluids for mayday 5",
+])
+def test_impossible_month_day_dates_miss(text):
+    assert parse_local(text, TODAY) is None
+
+@pytest.mark.parametrize("text, day", [
+    ("water 500ml on may 4", date(2024, 5, 4)),
+    ("water 500ml on sept 3, 2023", date(2023, 9, 3)),
+    ("water 500ml on february 29", date(2024, 2, 29)),
+])
+def test_month_day_dates(text, day):
+    assert parse_local(text, TODAY).entries[0].date == day
@@ -0,0 +1,125 @@
+import sys
+import json
+import time
+import threading
+from contextlib import contextmanager
+from functools import wraps
+from pathlib import Path
+from caltrack import config
+
+METRICS_FILE = Path.home() / ".caltrack" / "metrics.jsonl"
+
+# Per-phase wall-clock timers and counters for one command. Collection is off
+# unless --profile is given or metrics_file is configured, and a disabled
+# timer costs one flag check, so the hooks can stay in place everywhere.
+# Phases nest (cli.execute contains storage.read_range), so their times
+# overlap and are not meant to add up.
+
+_lock = threading.Lock()
+_enabled = False
+_phases = {}
+_counters = {}
+_events = []
+
+def enable(on: bool = True):
+    global _enabled
+    _enabled = on
+
+def enabled() -> bool:
+    return _enabled
+
+def reset():
+    with _lock:
+        _phases.clear()
+        _counters.clear()
+        del _events[:]
+
+def _add(name: str, seconds: float):
+    with _lock:
+        acc = _phases.setdefault(name, [0, 0.0])
+        acc[0] += 1
+        acc[1] += seconds
+
+@contextmanager
+def timer(name: str):
+    if not _enabled:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _add(name, time.perf_counter() - start)
+
+def timed(name: str):
+    """Decorator form of timer()."""
+    def wrap(fn):
+        @wraps(fn)
+        def inner(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            with timer(name):
+                return fn(*args, **kwargs)
+        return inner
+    return wrap
+
+def count(name: str, n: int = 1):
+    if _enabled:
+        with _lock:
+            _counters[name] = _counters.get(name, 0) + n
+
+def debug_enabled() -> bool:
+    return str(config.get("debug", "off")).lower() in ("1", "on", "true", "yes")
+
+def debug(message: str):
+    """Diagnostic detail: printed with --debug / CALTRACK_DEBUG=on, kept in the profile otherwise."""
+    if debug_enabled():
+        print(f"DEBUG: {message}")
+    if _enabled:
+        with _lock:
+            _events.append(message)
+
+def snapshot() -> dict:
+    with _lock:
+        return {
+            "phases": {name: {"calls": n, "ms": round(total * 1000, 3)} for name, (n, total) in _phases.items()},
+            "counters": dict(_counters),
+            "events": list(_events),
+        }
+
+def report(total_seconds: float = None) -> str:
+    """The collected phases as a table, slowest first."""
+    snap = snapshot()
+    rows = sorted(snap["phases"].items(), key=lambda kv: kv[1]["ms"], reverse=True)
+    lines = [f"{'Phase':<28} {'Calls':>6} {'Total ms':>10} {'Mean ms':>9}" + (f" {'%':>6}" if total_seconds else "")]
+    for name, p in rows:
+        line = f"{name:<28} {p['calls']:>6} {p['ms']:>10.2f} {p['ms'] / p['calls']:>9.2f}"
+        if total_seconds:
+            line += f" {100 * p['ms'] / (total_seconds * 1000):>6.1f}"
+        lines.append(line)
+    if total_seconds:
+        lines.append(f"{'total':<28} {'':>6} {total_seconds * 1000:>10.2f}")
+    for name, n in sorted(snap["counters"].items()):
+        lines.append(f"{name:<28} {n:>6}")
+    for message in snap["events"]:
+        lines.append(f"  · {message}")
+    return "\n".join(lines)
+
+def metrics_path():
+    """Where to append per-command metrics: the metrics_file setting ("on" for METRICS_FILE), or None."""
+    value = str(config.get("metrics_file", "") or "")
+    if value.lower() in ("", "0", "off", "false", "no"):
+        return None
+    if value.lower() in ("1", "on", "true", "yes"):
+        return METRICS_FILE
+    return Path(value).expanduser()
+
+def write(path: Path, **fields):
+    """Append this command's metrics to path as one JSON line."""
+    row = dict(ts=time.time(), **fields, **snapshot())
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("a") as f:
+        f.write(json.dumps(row) + "\n")
+
+def print_report(total_seconds: float = None, file=None):
+    print(report(total_seconds), file=file or sys.stderr)
@@ -64,6 +64,6 @@ class Command(BaseModel):
     entries: Optional[List[Entry]] = None
     needs_confirmation: Optional[bool] = False
     range: Optional[Range] = None
-    format: Optional[Literal["daily", "ma3", "ma5", "ma7"]] = None
+    format: Optional[Literal["daily", "ma3", "ma5", "ma7", "daily_stats", "weekly_stats"]] = None
     set: Optional[Dict[str, Union[str, int, float]]] = None
     explicit_time: bool = False
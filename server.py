@@ -0,0 +1,145 @@
+import io
+import os
+import sys
+import time
+import json
+import socket
+import threading
+import contextlib
+from contextlib import contextmanager
+from datetime import date
+from pathlib import Path
+
+SOCKET_PATH = Path.home() / ".caltrack" / "caltrack.sock"
+
+# One JSON object per line each way. A request is
+#   {"input": "<natural language>"} or {"command": {...Command JSON...}}
+# plus optional "verbose", "yes", "use_cache", "profile" and "debug" flags; the reply is
+#   {"ok": bool, "output": "<everything the command printed>"}.
+# The daemon runs commands non-interactively, as --batch does: dates are
+# taken as parsed and range deletes need "yes". So that a client at a
+# terminal can still prompt, {"parse": "<natural language>"} only parses,
+# replying {"ok": true, "output": "", "command": {...Command JSON...}}; the
+# client asks its questions and sends the result back as "command".
+
+# execute() reports by printing, and output is captured by swapping
+# sys.stdout, so requests are handled one at a time.
+_exec_lock = threading.Lock()
+
+def handle(request: dict) -> dict:
+    from caltrack import cli, metrics
+    out = io.StringIO()
+    with _exec_lock, contextlib.redirect_stdout(out), _request_settings(request):
+        started = time.perf_counter()
+        try:
+            if request.get("parse") is not None:
+                from caltrack.local_parser import parse_command
+                cmd = parse_command(request["parse"], use_cache=request.get("use_cache", True))
+                metrics.debug(f"Structured LLM response: {cmd}")
+                return {"ok": True, "output": out.getvalue(),
+                        "command": json.loads(json.dumps(cmd.model_dump(), default=date.isoformat))}
+            if request.get("command") is not None:
+                from caltrack.models import Command
+                with metrics.timer("command.validate"):
+                    cmd = Command.model_validate(request["command"])
+            else:
+                from caltrack.local_parser import parse_command
+                cmd = parse_command(request["input"], use_cache=request.get("use_cache", True))
+                metrics.debug(f"Structured LLM response: {cmd}")
+            with metrics.timer("cli.execute"):
+                ok = cli.execute(cmd, verbose=request.get("verbose", False), interactive=False,
+                                 assume_yes=request.get("yes", False))
+        except Exception as e:
+            print(f"ERROR: {e}")
+            ok = False
+        if request.get("profile"):
+            print(metrics.report(time.perf_counter() - started))
+    return {"ok": bool(ok), "output": out.getvalue()}
+
+@contextmanager
+def _request_settings(request: dict):
+    """Apply the client's --profile/--debug for one request (requests run one at a time)."""
+    from caltrack import metrics
+    debug = os.environ.get("CALTRACK_DEBUG")
+    if request.get("debug"):
+        os.environ["CALTRACK_DEBUG"] = "on"
+    if request.get("profile"):
+        metrics.reset()
+        metrics.enable()
+    try:
+        yield
+    finally:
+        metrics.enable(False)
+        if debug is None:
+            os.environ.pop("CALTRACK_DEBUG", None)
+        else:
+            os.environ["CALTRACK_DEBUG"] = debug
+
+def _warm_up():
+    """Load the journal, indexes and rollup into the storage caches, and the LLM stack."""
+    from caltrack.storage import backend as storage
+    from caltrack.local_parser import parse_command  # noqa: F401
+    from caltrack import llm_client  # noqa: F401
+    storage.read_all_records(packed=True)
+    storage.read_daily_totals()
+
+def _running() -> bool:
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        try:
+            s.connect(str(SOCKET_PATH))
+        except OSError:
+            return False
+    return True
+
+def serve():
+    """Run `caltrack serve` until interrupted."""
+    import socketserver
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            line = self.rfile.readline()
+            try:
+                reply = handle(json.loads(line))
+            except json.JSONDecodeError as e:
+                reply = {"ok": False, "output": f"ERROR: bad request: {e}\n"}
+            self.wfile.write(json.dumps(reply).encode() + b"\n")
+
+    SOCKET_PATH.parent.mkdir(exist_ok=True)
+    if SOCKET_PATH.exists():
+        if _running():
+            sys.exit(f"caltrack is already serving on {SOCKET_PATH}")
+        SOCKET_PATH.unlink()
+    _warm_up()
+    # Create the socket owner-only from the start, rather than chmod it after bind.
+    umask = os.umask(0o177)
+    try:
+        server = socketserver.ThreadingUnixStreamServer(str(SOCKET_PATH), Handler)
+    finally:
+        os.umask(umask)
+    print(f"caltrack serving on {SOCKET_PATH} (Ctrl-C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if SOCKET_PATH.exists():
+            SOCKET_PATH.unlink()
+
+def forward(request: dict):
+    """Send a request to a running daemon; returns its reply, or None if none is listening."""
+    if not SOCKET_PATH.exists():
+        return None
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        try:
+            s.connect(str(SOCKET_PATH))
+        except OSError:
+            return None
+        # Past this point the daemon may have run the command, so failures
+        # are errors rather than a cue to run it again locally.
+        s.sendall(json.dumps(request).encode() + b"\n")
+        with s.makefile("rb") as f:
+            line = f.readline()
+    if not line:
+        raise ConnectionError(f"caltrack daemon on {SOCKET_PATH} closed the connection without a reply")
+    return json.loads(line)
@@ -0,0 +1,73 @@
+from caltrack import config, metrics
+
+BACKENDS = ('ndjson', 'sqlite')
+
+def get_backend():
+    """Return the storage module selected by CALTRACK_BACKEND / config.json (default: ndjson)."""
+    name = str(config.get("backend", "ndjson")).lower()
+    if name == "sqlite":
+        from caltrack.storage import sqlite_store
+        return sqlite_store
+    if name == "ndjson":
+        from caltrack.storage import journal
+        return journal
+    raise ValueError(f"Unknown storage backend: {name} (expected one of {', '.join(BACKENDS)})")
+
+@metrics.timed("storage.append_record")
+def append_record(rec: dict):
+    return get_backend().append_record(rec)
+
+@metrics.timed("storage.append_records")
+def append_records(recs) -> None:
+    return get_backend().append_records(recs)
+
+@metrics.timed("storage.read_ids")
+def read_ids() -> set:
+    return get_backend().read_ids()
+
+@metrics.timed("storage.read_all_records")
+def read_all_records(packed: bool = False):
+    return get_backend().read_all_records(packed)
+
+@metrics.timed("storage.read_record")
+def read_record(rec_id: str):
+    return get_backend().read_record(rec_id)
+
+@metrics.timed("storage.replace_record")
+def replace_record(rec_id: str, rec: dict) -> dict:
+    return get_backend().replace_record(rec_id, rec)
+
+@metrics.timed("storage.remove_record")
+def remove_record(rec_id: str):
+    return get_backend().remove_record(rec_id)
+
+@metrics.timed("storage.delete_records")
+def delete_records(predicate, start=None, end=None) -> list:
+    return get_backend().delete_records(predicate, start, end)
+
+@metrics.timed("storage.update_records")
+def update_records(predicate, changes: dict, start=None, end=None) -> list:
+    return get_backend().update_records(predicate, changes, start, end)
+
+@metrics.timed("storage.read_range")
+def read_range(start=None, end=None, types=None, packed: bool = False):
+    return get_backend().read_range(start, end, types, packed)
+
+def iter_range(start=None, end=None, types=None, packed: bool = False):
+    # Not timed: the work happens as the caller consumes the generator.
+    return get_backend().iter_range(start, end, types, packed)
+
+@metrics.timed("storage.read_weights")
+def read_weights(start=None, end=None, packed: bool = False):
+    return get_backend().read_weights(start, end, packed)
+
+@metrics.timed("storage.search")
+def search(query: str, start=None, end=None, types=None, packed: bool = False):
+    return get_backend().search(query, start, end, types, packed)
+
+@metrics.timed("storage.read_daily_totals")
+def read_daily_totals(start=None, end=None):
+    return get_backend().read_daily_totals(start, end)
+
+def transaction():
+    return get_backend().transaction()
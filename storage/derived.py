@@ -0,0 +1,115 @@
+import json
+from pathlib import Path
+
+# State files derived from the journal (the rollup, the text index). Each
+# is a JSON object recording the journal size it covers ("size") and the
+# days invalidated by an update or delete ("dirty"), plus whatever the
+# store keeps. Writes don't rewrite it: each appends one line to a sibling
+# .log file,
+#   {"before": n, "after": n, ...what the store's fold() reads}
+# and the next read that needs it folds the log in under the journal lock,
+# saves the result and drops the log. A line whose "before" isn't the size
+# folded so far (a write the store didn't see) or a torn line means a
+# rebuild. Past log_limit bytes both files are dropped and the next read
+# rebuilds.
+
+def stat_key(path: Path):
+    """(inode, size, mtime) of path, or None if it's missing; the storage caches key on it."""
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        return None
+    return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+def in_range(key: str, start: str, end: str) -> bool:
+    return (not start or key >= start) and (not end or key <= end)
+
+class DerivedFile:
+    """One derived state file and its log; empty() is a blank state, fold(state, line) applies a log line."""
+
+    def __init__(self, path: Path, empty, fold, log_limit: int):
+        self.path = path
+        self.log = path.with_suffix(".log")
+        self.empty = empty
+        self.fold = fold
+        self.log_limit = log_limit
+        # The last state loaded or saved, with the stat_key of the file it
+        # matches, so a long-running process doesn't re-parse an unchanged file.
+        self.key = self.state = None
+
+    def _read(self) -> dict:
+        try:
+            with self.path.open("r") as f:
+                return json.load(f)
+        except (json.JSONDecodeError, OSError):
+            return self.empty()
+
+    def load(self) -> dict:
+        """The saved state; shared with the cache, so callers must not change it."""
+        key = stat_key(self.path)
+        if key is None:
+            return self.empty()
+        if self.key != key:
+            self.key, self.state = key, self._read()
+        return self.state
+
+    def save(self, state: dict):
+        """Replace the file with state and drop the log it folds in (journal lock held)."""
+        self.path.parent.mkdir(exist_ok=True)
+        tmp = self.path.with_suffix(".json.tmp")
+        with tmp.open("w") as f:
+            json.dump(state, f)
+        tmp.replace(self.path)
+        self.key, self.state = stat_key(self.path), state
+        if self.log.exists():
+            self.log.unlink()
+
+    def forget(self):
+        """Drop the in-memory copy, so the next load reads the file."""
+        self.key = self.state = None
+
+    def append(self, line: dict):
+        """Log one journal write (journal lock held)."""
+        self.log.parent.mkdir(exist_ok=True)
+        with self.log.open("a") as f:
+            f.write(json.dumps(line) + "\n")
+            full = f.tell() > self.log_limit
+        if full:
+            for path in (self.path, self.log):
+                if path.exists():
+                    path.unlink()
+
+    def replay(self):
+        """The saved state with the log folded in; returns (state, whether there was anything to fold).
+
+        The state is a fresh parse rather than the cached one other readers
+        may hold, so the caller can change it before saving.
+        """
+        try:
+            with self.log.open("r") as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            lines = []
+        state = self._read()
+        for line in lines:
+            try:
+                write = json.loads(line)
+            except json.JSONDecodeError:
+                write = None
+            if write is None or state['size'] != write['before']:
+                return self.empty(), True
+            self.fold(state, write)
+            state['size'] = write['after']
+        return state, bool(lines)
+
+    def current(self, size: int, start: str, end: str):
+        """The saved state if it covers a journal of `size` with no dirty day in [start, end], else None.
+
+        Only reads, so it needs no lock.
+        """
+        if self.log.exists():
+            return None
+        state = self.load()
+        if state['size'] != size or any(in_range(k, start, end) for k in state['dirty']):
+            return None
+        return state
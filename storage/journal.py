@@ -1,27 +1,1175 @@
+import os
 import json
+import time
+import hashlib
+import threading
+from itertools import chain
+from contextlib import contextmanager
+from datetime import date
 from pathlib import Path
+from caltrack import config, metrics
+from caltrack.storage import rollup, textindex, weightlog
+from caltrack.storage.derived import stat_key
+from caltrack.storage.records import pack as pack_record
 
+try:
+    import fcntl
+except ImportError:  # no advisory locks on this platform; only threads are serialized
+    fcntl = None
+
+# The journal used to be this one file; it is split into segments on first use
+# (see _migrate) and kept as entries.ndjson.migrated.
 JOURNAL = Path.home() / ".caltrack" / "entries.ndjson"
+LEGACY_INDEX = JOURNAL.with_suffix(".idx")
+
+# One segment per calendar month of the record's day (`date`, or `ts` for
+# weights): SEGMENTS/YYYY-MM.ndjson, with records that have no day in
+# SEGMENTS/undated.ndjson. A record and every update/delete line for it live
+# in the same segment; an update that moves a record to another month writes
+# a delete to the old segment and the update to the new one, so each segment
+# folds on its own.
+SEGMENTS = Path.home() / ".caltrack" / "journal"
+UNDATED = "undated"
+
+# Each segment has an id -> byte offset index next to it (YYYY-MM.idx). It is
+# append-only: each line is "id<TAB>offset<TAB>length<TAB>segment_size" and
+# later lines win. Removals are written with a "!" prefix on the id. The last
+# field records the segment size after the operation, so comparing the final
+# line against the real file size tells us whether the segment was edited
+# behind the index's back. There is one index line per segment line, which is
+# what the dead-record ratio is based on.
+INDEX_SUFFIX = ".idx"
+
+# manifest.json maps each segment to the lowest and highest day of any record
+# written to it, plus the segment size those bounds were computed for. Range
+# reads and range deletes only open segments whose bounds overlap the request.
+# Bounds only ever widen on append and are recomputed when a segment is
+# rewritten or its size no longer matches.
+MANIFEST = SEGMENTS / "manifest.json"
+
+# Updates and deletes are appended to the journal rather than rewriting it:
+#   {"op": "update", "id": ..., "rec": {...full record...}}
+#   {"op": "delete", "id": ...}
+# Readers fold these onto the plain records; compact() drops them again.
+OP_UPDATE = "update"
+OP_DELETE = "delete"
+DEFAULT_COMPACT_RATIO = 0.5
+COMPACT_MIN_LINES = 64
+# search() scans instead of using the text index when the range covers at
+# most this many segments.
+SEARCH_SCAN_SEGMENTS = 2
+
+# Weight records are not kept in the segments but in the ts-sorted series in
+# storage/weightlog.py; segments written before that are moved over once by
+# _migrate_weights, which leaves WEIGHTS_MOVED behind.
+WEIGHTS_MOVED = SEGMENTS / "weights.moved"
+
+# Segments also get checkpoints, YYYY-MM.snap: a JSON header line
+# {"version", "inode", "size", "mtime_ns", "offset", "digest"} and a JSON
+# array of the folded records of the segment's first `offset` bytes. Reads
+# load the snapshot and decode only the lines appended since, and checkpoint
+# again once those reach snapshot_tail_bytes (config; default below); a
+# rewrite writes one directly. The snapshot is trusted without rereading the
+# segment while the segment's inode, size and mtime are the ones it was
+# taken at; after appends, its first `offset` bytes must still hash to
+# `digest`. Any other file, a shorter one, an edit inside those bytes or an
+# unreadable snapshot means a full replay of the segment. Snapshots are JSON,
+# not pickle, so a stray or planted file under ~/.caltrack can't run code.
+SNAPSHOT_SUFFIX = ".snap"
+SNAPSHOT_VERSION = 2
+DEFAULT_SNAPSHOT_TAIL_BYTES = 64 * 1024
+
+# Writers hold _lock (threads in this process) and an exclusive flock on
+# LOCK_FILE (other processes: cron jobs, the bot, a CLI run) for the whole
+# read-check-write of an append or rewrite; see _writing(). Readers take no
+# lock: rewrites land by rename, and a reader that meets a half-written last
+# line (an append in flight) skips it. The rollup and text index are read
+# the same way while they cover the journal as it is; bringing one up to
+# date saves it, so that part runs under the lock.
+LOCK_FILE = SEGMENTS / "journal.lock"
+
+# With group_commit on, concurrent appends from threads in this process are
+# queued and written by one of them with a single write+fsync per segment.
+DEFAULT_GROUP_COMMIT_WINDOW_MS = 0
+
+_lock = threading.RLock()
+_lock_fd = None
+_lock_depth = 0
+# Per-thread transaction state; see transaction().
+_txn = threading.local()
+
+@contextmanager
+def _writing():
+    """Hold the journal for writing; re-entrant within a process."""
+    global _lock_fd, _lock_depth
+    with _lock:
+        if _lock_depth == 0 and fcntl is not None:
+            SEGMENTS.mkdir(parents=True, exist_ok=True)
+            fd = os.open(LOCK_FILE, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            except BaseException:
+                os.close(fd)
+                raise
+            _lock_fd = fd
+        _lock_depth += 1
+        try:
+            yield
+        finally:
+            _lock_depth -= 1
+            if _lock_depth == 0 and _lock_fd is not None:
+                fcntl.flock(_lock_fd, fcntl.LOCK_UN)
+                os.close(_lock_fd)
+                _lock_fd = None
+
+def _record_day(rec: dict):
+    day = rec.get('date') or rec.get('ts')
+    return day[:10] if day else None
+
+def _segment_of(rec: dict) -> str:
+    day = _record_day(rec)
+    return day[:7] if day else UNDATED
+
+# Folded segments and loaded indexes, reused while their file is unchanged
+# (same inode, size and mtime). In a one-shot CLI run this saves little; in
+# `caltrack serve` it keeps the whole journal parsed in memory between
+# commands. Cached dict records are copied on the way out since callers may
+# mutate them; packed records are read-only and shared.
+_cache = {}
+
+def _cached(kind: str, seg: str, path: Path, load):
+    # Stat before loading: if the file changes mid-load the key is already
+    # stale and the next call reloads.
+    key = stat_key(path)
+    hit = _cache.get((kind, seg))
+    if key is not None and hit is not None and hit[0] == key:
+        return hit[1]
+    value = load()
+    _cache[(kind, seg)] = (key, value)
+    return value
+
+def _segment_path(seg: str) -> Path:
+    return SEGMENTS / f"{seg}.ndjson"
+
+def _index_path(seg: str) -> Path:
+    return SEGMENTS / f"{seg}{INDEX_SUFFIX}"
+
+def _snapshot_path(seg: str) -> Path:
+    return SEGMENTS / f"{seg}{SNAPSHOT_SUFFIX}"
+
+def _listed_segments() -> list:
+    if not SEGMENTS.exists():
+        return []
+    return sorted(p.name[:-len(".ndjson")] for p in SEGMENTS.glob("*.ndjson"))
+
+def _segment_keys() -> list:
+    _migrate()
+    return _listed_segments()
+
+def _segment_size(seg: str) -> int:
+    path = _segment_path(seg)
+    return path.stat().st_size if path.exists() else 0
+
+def _journal_size() -> int:
+    """Total size of all segments; the rollup uses it to notice outside edits."""
+    return sum(_segment_size(seg) for seg in _segment_keys())
+
+def _read_file(path: Path):
+    if not path.exists():
+        return
+    with path.open("r") as f:
+        for raw in f:
+            line = raw.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                if raw.endswith("\n"):
+                    raise
+                # Unterminated last line: another process is mid-append.
+                return
+
+def _read_segment(seg: str):
+    return _read_file(_segment_path(seg))
+
+def _line_day(rec: dict):
+    return _record_day(rec['rec'] if rec.get('op') == OP_UPDATE else rec)
+
+# --- manifest ---
+
+def _load_manifest() -> dict:
+    if not MANIFEST.exists():
+        return {}
+    try:
+        with MANIFEST.open("r") as f:
+            return json.load(f)
+    except (json.JSONDecodeError, OSError):
+        return {}
+
+def _save_manifest(manifest: dict):
+    SEGMENTS.mkdir(parents=True, exist_ok=True)
+    tmp = MANIFEST.with_suffix(".json.tmp")
+    with tmp.open("w") as f:
+        json.dump(manifest, f, sort_keys=True)
+    tmp.replace(MANIFEST)
+
+def _bounds(days) -> dict:
+    days = [d for d in days if d]
+    return {"min": min(days) if days else None, "max": max(days) if days else None}
+
+def _manifest() -> dict:
+    """The manifest, with entries refreshed for segments whose size changed."""
+    manifest = _load_manifest()
+    keys = _segment_keys()
+    changed = False
+    for seg in keys:
+        size = _segment_size(seg)
+        entry = manifest.get(seg)
+        if entry is None or entry.get('size') != size:
+            manifest[seg] = dict(_bounds(_line_day(r) for r in _read_segment(seg)), size=size)
+            changed = True
+    for seg in set(manifest) - set(keys):
+        del manifest[seg]
+        changed = True
+    if changed:
+        with _writing():
+            _save_manifest(manifest)
+    return manifest
+
+def _note_append(seg: str, recs, before: int, after: int):
+    manifest = _load_manifest()
+    entry = manifest.get(seg)
+    if entry is None and before == 0:
+        entry = {"min": None, "max": None, "size": 0}
+    if entry is not None and entry.get('size') == before:
+        days = [_line_day(r) for r in recs]
+        if entry['min']:
+            days += [entry['min'], entry['max']]
+        entry = _bounds(days)
+    else:
+        entry = _bounds(_line_day(r) for r in _read_segment(seg))
+    manifest[seg] = dict(entry, size=after)
+    _save_manifest(manifest)
+
+def _month_overlaps(seg: str, lo, hi) -> bool:
+    if seg == UNDATED:
+        return not lo and not hi
+    return (not lo or seg >= lo[:7]) and (not hi or seg <= hi[:7])
+
+def _segments_for(lo=None, hi=None) -> list:
+    """Segments that can hold records with a day in [lo, hi] (ISO strings, either may be None)."""
+    out = []
+    for seg, entry in sorted(_manifest().items()):
+        if entry['min'] is None:
+            if not lo and not hi:
+                out.append(seg)
+        elif (not hi or entry['min'] <= hi) and (not lo or entry['max'] >= lo):
+            out.append(seg)
+    return out
+
+# --- per-segment index ---
+
+def _index_line(key: str, offset: int, length: int, size: int) -> str:
+    return f"{key}\t{offset}\t{length}\t{size}\n"
+
+def _index_tail_size(seg: str):
+    index = _index_path(seg)
+    if not index.exists():
+        return None
+    with index.open("rb") as f:
+        f.seek(0, 2)
+        end = f.tell()
+        f.seek(max(0, end - 512))
+        lines = f.read().splitlines()
+    if not lines:
+        return 0
+    try:
+        return int(lines[-1].split(b"\t")[3])
+    except (IndexError, ValueError):
+        return None
+
+def _index_is_fresh(seg: str) -> bool:
+    size = _segment_size(seg)
+    if not _index_path(seg).exists():
+        return size == 0
+    return _index_tail_size(seg) == size
+
+def _load_index(seg: str):
+    offsets = {}
+    lines = 0
+    index = _index_path(seg)
+    if not index.exists():
+        return offsets, lines
+    with index.open("r") as f:
+        for line in f:
+            key, offset, length, _ = line.rstrip("\n").split("\t")
+            if key.startswith("!"):
+                offsets.pop(key[1:], None)
+            else:
+                offsets[key] = (int(offset), int(length))
+            if int(length):
+                lines += 1
+    return offsets, lines
+
+def _index(seg: str):
+    if not _index_is_fresh(seg):
+        return rebuild_index(seg)
+    try:
+        return _cached("index", seg, _index_path(seg), lambda: _load_index(seg))
+    except ValueError:
+        return rebuild_index(seg)
+
+def _scan_offsets(seg: str):
+    """Yield (offset, length, record) for every non-blank line in a segment."""
+    path = _segment_path(seg)
+    if not path.exists():
+        return
+    offset = 0
+    with path.open("rb") as f:
+        for raw in f:
+            line = raw.rstrip(b"\r\n")
+            if line.strip():
+                yield offset, len(line), json.loads(line)
+            offset += len(raw)
+
+def _index_key(rec: dict):
+    op = rec.get('op')
+    if op == OP_DELETE:
+        return "!" + rec['id']
+    if op == OP_UPDATE:
+        return rec['rec']['id']
+    return rec.get('id')
+
+def rebuild_index(seg: str = None):
+    """Rescan a segment (default: every segment) and rewrite its id -> offset index.
+
+    Returns the segment's (offsets, line count) when one was given.
+    """
+    if seg is None:
+        for key in _segment_keys():
+            rebuild_index(key)
+        return None
+    with _writing():
+        size = _segment_size(seg)
+        offsets = {}
+        lines = 0
+        index = _index_path(seg)
+        tmp = index.with_suffix(INDEX_SUFFIX + ".tmp")
+        with tmp.open("w") as f:
+            for offset, length, rec in _scan_offsets(seg):
+                key = _index_key(rec)
+                if key is None:
+                    continue
+                f.write(_index_line(key, offset, length, size))
+                if key.startswith("!"):
+                    offsets.pop(key[1:], None)
+                else:
+                    offsets[key] = (offset, length)
+                lines += 1
+            f.write(_index_line("!", 0, 0, size))
+        tmp.replace(index)
+    return offsets, lines
+
+def verify_index() -> bool:
+    """Check that every segment index is current and each entry points at its record."""
+    for seg in _segment_keys():
+        if not _index_is_fresh(seg):
+            return False
+        expected = {}
+        for offset, length, rec in _scan_offsets(seg):
+            key = _index_key(rec)
+            if key is None:
+                continue
+            if key.startswith("!"):
+                expected.pop(key[1:], None)
+            else:
+                expected[key] = (offset, length)
+        if _load_index(seg)[0] != expected:
+            return False
+    return True
+
+# --- migration from the single-file layout ---
+
+def _migrate():
+    """Split a legacy entries.ndjson into month segments and move weights out; a no-op once done.
+
+    Segments are written and synced before the old file is renamed, and
+    records whose id is already in a segment are skipped, so an interrupted
+    migration simply runs again.
+    """
+    if JOURNAL.exists():
+        _migrate_legacy()
+    if not WEIGHTS_MOVED.exists() and SEGMENTS.exists():
+        _migrate_weights()
+
+def _migrate_legacy():
+    with _writing():
+        if not JOURNAL.exists():
+            return
+        before = JOURNAL.stat().st_size
+        groups = {seg: _fold(_read_segment(seg)) for seg in _listed_segments()}
+        existing = {r.get('id') for records in groups.values() for r in records}
+        for rec in _fold(_read_file(JOURNAL)):
+            if rec.get('id') not in existing:
+                groups.setdefault(_segment_of(rec), []).append(rec)
+        manifest = _load_manifest()
+        for seg, records in groups.items():
+            _write_segment(seg, records, manifest)
+        _save_manifest(manifest)
+        JOURNAL.replace(JOURNAL.with_suffix(".ndjson.migrated"))
+        if LEGACY_INDEX.exists():
+            LEGACY_INDEX.unlink()
+        _update_derived(before, sum(_segment_size(seg) for seg in _listed_segments()))
+
+def _migrate_weights():
+    """Move weight records from the segments into weightlog's series.
+
+    The series is written (merged by id with any weights.ndjson already
+    there) before the segments are rewritten without the weights, so an
+    interrupted move just runs again.
+    """
+    with _writing():
+        if WEIGHTS_MOVED.exists():
+            return
+        groups, moved = {}, []
+        for seg in _listed_segments():
+            records = _fold(_read_segment(seg))
+            kept = [r for r in records if r.get('type') != 'weight']
+            if len(kept) != len(records):
+                moved.extend(r for r in records if r.get('type') == 'weight')
+                groups[seg] = kept
+        if moved:
+            weightlog.apply([("put", r) for r in moved])
+            # Not _rewrite_segments: that lists segments, which migrates.
+            before = sum(_segment_size(seg) for seg in _listed_segments())
+            manifest = _load_manifest()
+            for seg, records in groups.items():
+                _write_segment(seg, records, manifest)
+            _save_manifest(manifest)
+            _update_derived(before, sum(_segment_size(seg) for seg in _listed_segments()))
+        WEIGHTS_MOVED.touch()
+
+def _pending():
+    return getattr(_txn, 'pending', None)
+
+def _copy(rec: dict) -> dict:
+    """A copy of a record or update line that callers can't change behind the transaction's back."""
+    if rec.get('op') == OP_UPDATE:
+        return dict(rec, rec=dict(rec['rec']))
+    return dict(rec)
+
+def _append_line(seg: str, key: str, rec: dict):
+    pending = _pending()
+    if pending is not None:
+        # Buffered writes are copies, and so is what _locate hands out, so
+        # editing a record read back inside the transaction can't change them.
+        rec = _copy(rec)
+        pending.append((seg, key, rec))
+        if key.startswith("!"):
+            _txn.overlay[key[1:]] = None
+        else:
+            _txn.overlay[key] = rec['rec'] if rec.get('op') == OP_UPDATE else rec
+        return
+    SEGMENTS.mkdir(parents=True, exist_ok=True)
+    _migrate()
+    if not _index_is_fresh(seg):
+        rebuild_index(seg)
+    line = json.dumps(rec).encode()
+    with _segment_path(seg).open("ab") as f:
+        offset = f.tell()
+        f.write(line + b"\n")
+    size = _segment_size(seg)
+    with _index_path(seg).open("a") as f:
+        f.write(_index_line(key, offset, len(line), size))
+    _note_append(seg, [rec], offset, size)
+
+def _update_derived(before: int, after: int, added=(), dirty=()):
+    """Bring the rollup and text index up to a write that took the journal from before to after bytes."""
+    rollup.update(before, after, added=added, dirty=dirty)
+    textindex.update(before, after, added=added, dirty=dirty)
+
+def _after_write(before: int, added=(), dirty=()):
+    if _pending() is not None:
+        _txn.added.extend(added)
+        _txn.dirty.update(dirty)
+    else:
+        _update_derived(before, _journal_size(), added=added, dirty=dirty)
+
+def _weight_ops(ops):
+    """Apply weightlog ops now, or buffer them (visible to this thread) inside a transaction."""
+    if _pending() is None:
+        _migrate()
+        weightlog.apply(ops)
+        return
+    ops = [(op, dict(value) if op == "put" else value) for op, value in ops]
+    _txn.weights.extend(ops)
+    for op, value in ops:
+        if op == "put":
+            _txn.overlay[value['id']] = value
+        else:
+            _txn.overlay[value] = None
+
+def _find_weight(rec_id: str):
+    overlay = getattr(_txn, 'overlay', None)
+    if overlay is not None and rec_id in overlay:
+        rec = overlay[rec_id]
+        return dict(rec) if rec is not None and rec.get('type') == 'weight' else None
+    _migrate()
+    return weightlog.find(rec_id)
 
 def append_record(rec: dict):
     allowed_types = ('food', 'activity', 'fluid', 'weight')
     if rec['type'] not in allowed_types:
         raise ValueError(f"Unknown record type: {rec['type']}")
-    JOURNAL.parent.mkdir(exist_ok=True)
-    with JOURNAL.open("a") as f:
-        f.write(json.dumps(rec) + "\n")
-
-def read_all_records():
-    records = []
-    if not JOURNAL.exists():
-        return records
-    with JOURNAL.open("r") as f:
-        for line in f:
-            records.append(json.loads(line.strip()))
-    return records
+    if rec['type'] == 'weight':
+        with _writing():
+            _weight_ops([("put", rec)])
+        return
+    if _pending() is None and _group_commit_enabled():
+        _commit_grouped([(_segment_of(rec), rec['id'], rec)], added=[rec])
+        return
+    with _writing():
+        before = _journal_size()
+        _append_line(_segment_of(rec), rec['id'], rec)
+        _after_write(before, added=[rec])
+
+def append_records(recs) -> None:
+    """Append many new records with one write and fsync per segment (for bulk imports)."""
+    allowed_types = ('food', 'activity', 'fluid', 'weight')
+    for rec in recs:
+        if rec['type'] not in allowed_types:
+            raise ValueError(f"Unknown record type: {rec['type']}")
+    weights = [("put", r) for r in recs if r['type'] == 'weight']
+    entries = [r for r in recs if r['type'] != 'weight']
+    with _writing():
+        if _pending() is not None:
+            for rec in recs:
+                append_record(rec)
+            return
+        _migrate()
+        if weights:
+            weightlog.apply(weights)
+        if entries:
+            _write_batch([(_segment_of(r), r['id'], r) for r in entries], added=entries)
+
+def read_ids() -> set:
+    """Every live record id, from the offset indexes and the weight series."""
+    ids = set()
+    for seg in _segment_keys():
+        ids.update(_index(seg)[0])
+    ids.update(r['id'] for r in weightlog.read_range())
+    return ids
+
+def _read_at(seg: str, offset: int, length: int):
+    with _segment_path(seg).open("rb") as f:
+        f.seek(offset)
+        line = f.read(length)
+    try:
+        rec = json.loads(line)
+    except json.JSONDecodeError:
+        return None
+    if rec.get('op') == OP_UPDATE:
+        return rec['rec']
+    return rec
+
+def _locate(rec_id: str):
+    """Find rec_id; returns (record, segment, live ids in segment, segment index lines)."""
+    overlay = getattr(_txn, 'overlay', None)
+    if overlay is not None and rec_id in overlay:
+        rec = overlay[rec_id]
+        if rec is None:
+            return None, None, 0, 0
+        return dict(rec), _segment_of(rec), 0, 0
+    # Recent months are the likeliest targets for edits, so look there first.
+    for seg in reversed(_segment_keys()):
+        offsets, lines = _index(seg)
+        if rec_id not in offsets:
+            continue
+        rec = _read_at(seg, *offsets[rec_id])
+        if rec is None or rec.get('id') != rec_id:
+            # The segment changed under us; rebuild once and retry.
+            offsets, lines = rebuild_index(seg)
+            rec = _read_at(seg, *offsets[rec_id]) if rec_id in offsets else None
+        if rec is not None:
+            return rec, seg, len(offsets), lines
+    return None, None, 0, 0
+
+def read_record(rec_id: str):
+    """Return the record with the given id by seeking straight to it, or None."""
+    rec, _, _, _ = _locate(rec_id)
+    if rec is None:
+        rec = _find_weight(rec_id)
+    return dict(rec) if rec is not None and rec.get('type') == 'weight' else rec
+
+def _compact_ratio() -> float:
+    return float(config.get("compact_ratio", DEFAULT_COMPACT_RATIO))
+
+def _dead_ratio(live: int, lines: int) -> float:
+    return (lines - live) / lines if lines else 0.0
+
+def replace_record(rec_id: str, rec: dict) -> dict:
+    """Append an update record that supersedes the current version of rec_id."""
+    with _writing():
+        old, seg, live, lines = _locate(rec_id)
+        if old is None or old.get('type') == 'weight':
+            if _find_weight(rec_id) is None:
+                raise KeyError(f"Entry {rec_id} not found")
+            rec.setdefault('id', rec_id)
+            ops = [("delete", rec_id)] if rec['id'] != rec_id or rec.get('type') != 'weight' else []
+            if rec.get('type') == 'weight':
+                _weight_ops(ops + [("put", rec)])
+            else:
+                _weight_ops(ops)
+                append_record(rec)
+            return rec
+        before = _journal_size()
+        new_seg = _segment_of(rec)
+        if rec.get('id', rec_id) != rec_id or new_seg != seg:
+            _append_line(seg, "!" + rec_id, {"op": OP_DELETE, "id": rec_id})
+            lines += 1
+        rec.setdefault('id', rec_id)
+        _append_line(new_seg, rec['id'], {"op": OP_UPDATE, "id": rec['id'], "rec": rec})
+        _after_write(before, dirty=[rollup.record_day(old), rollup.record_day(rec)])
+    if new_seg == seg:
+        maybe_compact(seg, live, lines + 1)
+    else:
+        maybe_compact(seg, live - 1, lines)
+    return rec
+
+def remove_record(rec_id: str):
+    """Append a tombstone for rec_id; returns the removed record or None."""
+    with _writing():
+        old, seg, live, lines = _locate(rec_id)
+        if old is None or old.get('type') == 'weight':
+            old = _find_weight(rec_id)
+            if old is not None:
+                _weight_ops([("delete", rec_id)])
+            return old
+        before = _journal_size()
+        _append_line(seg, "!" + rec_id, {"op": OP_DELETE, "id": rec_id})
+        _after_write(before, dirty=[rollup.record_day(old)])
+    maybe_compact(seg, live - 1, lines + 1)
+    return old
 
-def _rewrite_all_records(records):
-    JOURNAL.parent.mkdir(exist_ok=True)
-    with JOURNAL.open("w") as f:
+def _fold(lines, pack=None):
+    """Apply update/delete lines to the plain records; pack, if given, converts each survivor."""
+    out = []
+    pos = {}
+    for rec in lines:
+        op = rec.get('op')
+        if op == OP_DELETE:
+            i = pos.pop(rec['id'], None)
+            if i is not None:
+                out[i] = None
+        elif op == OP_UPDATE:
+            new = rec['rec']
+            i = pos.get(rec['id'])
+            if i is None:
+                pos[new['id']] = len(out)
+                out.append(pack(new) if pack else new)
+            else:
+                out[i] = pack(new) if pack else new
+        else:
+            pos[rec.get('id')] = len(out)
+            out.append(pack(rec) if pack else rec)
+    return [r for r in out if r is not None]
+
+# --- snapshots ---
+
+def _snapshot_tail_bytes() -> int:
+    return int(config.get("snapshot_tail_bytes", DEFAULT_SNAPSHOT_TAIL_BYTES))
+
+def _digest(f, offset: int) -> str:
+    f.seek(0)
+    return hashlib.blake2b(f.read(offset), digest_size=16).hexdigest()
+
+def _save_snapshot(seg: str, records: list, offset: int):
+    """Checkpoint the folded records of a segment's first offset bytes."""
+    path = _snapshot_path(seg)
+    try:
+        f = _segment_path(seg).open("rb")
+    except FileNotFoundError:
+        return
+    with f:
+        # Stat before hashing: an edit in between then fails the stat check later.
+        st = os.fstat(f.fileno())
+        if st.st_size < offset:
+            return
+        header = {"version": SNAPSHOT_VERSION, "inode": st.st_ino, "size": st.st_size,
+                  "mtime_ns": st.st_mtime_ns, "offset": offset, "digest": _digest(f, offset)}
+    # Readers checkpoint without the journal lock, so each writes its own
+    # temporary file; whichever rename lands last wins, and either is valid.
+    tmp = path.with_suffix(f"{SNAPSHOT_SUFFIX}.{os.getpid()}.{threading.get_ident()}.tmp")
+    with tmp.open("wb") as out:
+        out.write(json.dumps(header).encode() + b"\n")
+        out.write(json.dumps(records).encode())
+    tmp.replace(path)
+    metrics.count("journal.snapshots_written")
+
+def _load_snapshot(seg: str, f):
+    """(records, offset) from seg's snapshot if it still describes the open segment f, else None."""
+    try:
+        with _snapshot_path(seg).open("rb") as snap:
+            header = json.loads(snap.readline())
+            st = os.fstat(f.fileno())
+            if header["version"] != SNAPSHOT_VERSION or header["inode"] != st.st_ino:
+                return None
+            offset = header["offset"]
+            if (st.st_size, st.st_mtime_ns) != (header["size"], header["mtime_ns"]):
+                if st.st_size < offset or _digest(f, offset) != header["digest"]:
+                    return None
+            return json.loads(snap.read()), offset
+    except Exception:  # missing, truncated or corrupt: replay instead
+        return None
+
+def _read_tail(f):
+    """Decode the complete lines from f's position on; returns (records, the bytes decoded)."""
+    data = f.read()
+    data = data[:data.rfind(b"\n") + 1]  # an unterminated last line is an append in flight
+    return [json.loads(line) for line in data.splitlines() if line.strip()], data
+
+def _load_segment(seg: str, pack=None) -> list:
+    """A segment's live records: its snapshot folded with the lines written since.
+
+    Writes a new snapshot when those lines reach the snapshot threshold.
+    """
+    try:
+        f = _segment_path(seg).open("rb")
+    except FileNotFoundError:
+        return []
+    with f:
+        snap = _load_snapshot(seg, f)
+        base, offset = snap if snap is not None else ([], 0)
+        f.seek(offset)
+        tail, data = _read_tail(f)
+    metrics.count("journal.snapshot_hits" if snap is not None else "journal.snapshot_misses")
+    if not tail:
+        return [pack(r) for r in base] if pack else base
+    if len(data) < _snapshot_tail_bytes():
+        return _fold(chain(base, tail), pack)
+    records = _fold(chain(base, tail))
+    _save_snapshot(seg, records, offset + len(data))
+    return [pack(r) for r in records] if pack else records
+
+@metrics.timed("journal.decode")
+def _read_folded(segs, packed: bool = False) -> list:
+    """Live records of the given segments, including this thread's pending writes.
+
+    With packed=True records come back as compact storage.records types.
+    """
+    pending = {}
+    for seg, _, rec in _pending() or ():
+        pending.setdefault(seg, []).append(rec)
+    out = []
+    segs = sorted(set(segs) | set(pending))
+    metrics.count("journal.segments_read", len(segs))
+    for seg in segs:
+        if seg in pending:
+            out.extend(_fold(chain(_read_segment(seg), pending[seg]), pack_record if packed else None))
+        elif packed:
+            out.extend(_cached("packed", seg, _segment_path(seg), lambda: _load_segment(seg, pack_record)))
+        else:
+            out.extend(dict(r) for r in _cached("records", seg, _segment_path(seg), lambda: _load_segment(seg)))
+    return out
+
+def read_all_records(packed: bool = False):
+    return _read_folded(_segment_keys(), packed) + read_weights(packed=packed)
+
+def _write_segment(seg: str, records: list, manifest: dict):
+    """Atomically replace one segment (and its index) with records; drops it when empty."""
+    path = _segment_path(seg)
+    index = _index_path(seg)
+    if not records:
+        for p in (path, index, _snapshot_path(seg)):
+            if p.exists():
+                p.unlink()
+        manifest.pop(seg, None)
+        return
+    SEGMENTS.mkdir(parents=True, exist_ok=True)
+    offset = 0
+    index_lines = []
+    tmp = path.with_suffix(".ndjson.tmp")
+    with tmp.open("wb") as f:
         for r in records:
-            f.write(json.dumps(r) + "\n")
+            line = json.dumps(r).encode()
+            f.write(line + b"\n")
+            if 'id' in r:
+                index_lines.append((r['id'], offset, len(line)))
+            offset += len(line) + 1
+        f.flush()
+        os.fsync(f.fileno())
+    index_tmp = index.with_suffix(INDEX_SUFFIX + ".tmp")
+    with index_tmp.open("w") as f:
+        for key, off, length in index_lines:
+            f.write(_index_line(key, off, length, offset))
+        f.write(_index_line("!", 0, 0, offset))
+    tmp.replace(path)
+    index_tmp.replace(index)
+    manifest[seg] = dict(_bounds(_record_day(r) for r in records), size=offset)
+    if offset >= _snapshot_tail_bytes():
+        _save_snapshot(seg, records, offset)
+    elif _snapshot_path(seg).exists():
+        _snapshot_path(seg).unlink()
+
+@metrics.timed("journal.rewrite")
+def _rewrite_segments(groups: dict, dirty=()):
+    """Rewrite each segment in groups ({segment: records}) and update the rollup and text index once."""
+    metrics.count("journal.segments_rewritten", len(groups))
+    with _writing():
+        before = _journal_size()
+        manifest = _manifest()
+        for seg, records in groups.items():
+            _write_segment(seg, records, manifest)
+        _save_manifest(manifest)
+        _update_derived(before, _journal_size(), dirty=dirty)
+
+def _group(records) -> dict:
+    groups = {}
+    for r in records:
+        groups.setdefault(_segment_of(r), []).append(r)
+    return groups
+
+def _rewrite_all_records(records, dirty=()):
+    """Replace the whole journal with records, re-split into month segments and the weight series."""
+    with _writing():
+        groups = {seg: [] for seg in _segment_keys()}
+        groups.update(_group(r for r in records if r.get('type') != 'weight'))
+        _rewrite_segments(groups, dirty=dirty)
+        weightlog.replace_all([r for r in records if r.get('type') == 'weight'])
+
+def compact(segs=None):
+    """Rewrite segments (default: all) with only live records, dropping update/delete records."""
+    with _writing():
+        _flush_pending()
+        groups = {}
+        for seg in segs if segs is not None else _segment_keys():
+            offsets, lines = _index(seg)
+            if lines > len(offsets):
+                groups[seg] = _load_segment(seg)
+        if groups:
+            _rewrite_segments(groups)
+
+def _needs_compaction(live: int, lines: int) -> bool:
+    return lines >= COMPACT_MIN_LINES and _dead_ratio(live, lines) > _compact_ratio()
+
+def maybe_compact(seg: str = None, live: int = None, lines: int = None, background: bool = True):
+    """Compact segments whose share of dead lines crosses the configured ratio.
+
+    With a segment and its index counts (which callers that just touched the
+    index pass in) only that segment is checked; otherwise every segment is.
+    With background=True the rewrite runs on a worker thread so the caller
+    can return; the interpreter still waits for it before exiting.
+    """
+    if _pending() is not None:
+        return None
+    if seg is not None and live is not None and lines is not None:
+        segs = [seg] if _needs_compaction(live, lines) else []
+    else:
+        segs = []
+        for key in [seg] if seg is not None else _segment_keys():
+            offsets, count = _index(key)
+            if _needs_compaction(len(offsets), count):
+                segs.append(key)
+    if not segs:
+        return None
+    if not background:
+        compact(segs)
+        return None
+    worker = threading.Thread(target=compact, args=(segs,), name="caltrack-compact")
+    worker.start()
+    return worker
+
+def _write_batch(items, added=(), dirty=()):
+    """Append (segment, key, record) items with one write and fsync per segment."""
+    SEGMENTS.mkdir(parents=True, exist_ok=True)
+    before = _journal_size()
+    by_seg = {}
+    for seg, key, rec in items:
+        by_seg.setdefault(seg, []).append((key, rec))
+    for seg, entries in by_seg.items():
+        if not _index_is_fresh(seg):
+            rebuild_index(seg)
+        lines = [json.dumps(rec).encode() for _, rec in entries]
+        with _segment_path(seg).open("ab") as f:
+            offset = start = f.tell()
+            f.write(b"".join(line + b"\n" for line in lines))
+            f.flush()
+            os.fsync(f.fileno())
+        after = _segment_size(seg)
+        index_lines = []
+        for (key, _), line in zip(entries, lines):
+            index_lines.append(_index_line(key, offset, len(line), after))
+            offset += len(line) + 1
+        with _index_path(seg).open("a") as f:
+            f.write("".join(index_lines))
+        _note_append(seg, [rec for _, rec in entries], start, after)
+    _update_derived(before, _journal_size(), added=added, dirty=dirty)
+
+def _flush_pending():
+    """Write everything buffered by the current transaction with one write and fsync per segment."""
+    pending = _pending()
+    if pending is None or not (pending or _txn.weights):
+        return
+    if _txn.weights:
+        weightlog.apply(_txn.weights)
+    if pending:
+        _write_batch(pending, added=_txn.added, dirty=_txn.dirty)
+    _txn.pending, _txn.overlay, _txn.added, _txn.dirty, _txn.weights = [], {}, [], set(), []
+
+_commit_cond = threading.Condition()
+_commit_queue = []
+_committing = False
+
+def _group_commit_enabled() -> bool:
+    return str(config.get("group_commit", "off")).lower() in ("1", "on", "true", "yes")
+
+def _commit_grouped(items, added=()):
+    """Durably append items, sharing a write+fsync with appends from other threads.
+
+    The first caller to find no commit in progress becomes the leader: it
+    optionally waits group_commit_window_ms for company, then writes
+    everything queued so far. Callers arriving meanwhile queue up for the
+    next round, so under contention one fsync covers many appends.
+    """
+    global _committing
+    entry = {"items": items, "added": list(added), "done": False, "error": None}
+    with _commit_cond:
+        _commit_queue.append(entry)
+        while _committing and not entry["done"]:
+            _commit_cond.wait()
+        if entry["done"]:
+            if entry["error"] is not None:
+                raise entry["error"]
+            return
+        _committing = True
+    batch, error = [], None
+    try:
+        window = float(config.get("group_commit_window_ms", DEFAULT_GROUP_COMMIT_WINDOW_MS))
+        if window > 0:
+            time.sleep(window / 1000)
+        with _commit_cond:
+            batch = _commit_queue[:]
+            del _commit_queue[:]
+        with _writing():
+            _write_batch([i for e in batch for i in e["items"]], added=[r for e in batch for r in e["added"]])
+    except BaseException as e:
+        error = e
+    finally:
+        with _commit_cond:
+            for e in batch:
+                e["done"], e["error"] = True, error
+            _committing = False
+            _commit_cond.notify_all()
+    if error is not None:
+        raise error
+
+@contextmanager
+def transaction():
+    """Group appends, updates and deletes into one journal write.
+
+    Writes made on this thread inside the block are buffered (and visible to
+    this thread's reads) and land with a single write+fsync when it exits.
+    If the block raises, the buffered writes are discarded. Bulk rewrites
+    (delete_records/update_records/compact) flush the buffer first.
+    """
+    with _writing():
+        if _pending() is not None:
+            yield
+            return
+        _txn.pending, _txn.overlay, _txn.added, _txn.dirty, _txn.weights = [], {}, [], set(), []
+        try:
+            yield
+            _flush_pending()
+        finally:
+            _txn.pending = _txn.overlay = _txn.weights = None
+    maybe_compact()
+
+def _iso(d):
+    return d.isoformat() if d else None
+
+def delete_records(predicate, start=None, end=None) -> list:
+    """Drop every record matching predicate, rewriting only the segments that had matches.
+
+    When start/end are given they must cover every day predicate can match;
+    only segments overlapping [start, end] are read.
+    """
+    with _writing():
+        _flush_pending()
+        groups, removed = {}, []
+        for seg in _segments_for(_iso(start), _iso(end)):
+            records = _load_segment(seg)
+            kept = []
+            for r in records:
+                (removed if predicate(r) else kept).append(r)
+            if len(kept) != len(records):
+                groups[seg] = kept
+        if removed:
+            _rewrite_segments(groups, dirty={rollup.record_day(r) for r in removed})
+        weights = [r for r in read_weights(start, end) if predicate(r)]
+        if weights:
+            weightlog.apply([("delete", r['id']) for r in weights])
+            removed.extend(weights)
+    return removed
+
+def update_records(predicate, changes: dict, start=None, end=None) -> list:
+    """Apply changes to every record matching predicate, rewriting only the segments involved.
+
+    start/end narrow the segments read, as for delete_records. Records whose
+    day moves to another month are moved to that month's segment.
+    """
+    with _writing():
+        _flush_pending()
+        loaded = {seg: _load_segment(seg) for seg in _segments_for(_iso(start), _iso(end))}
+        updated, moved = [], []
+        dirty, touched = set(), set()
+        for seg, records in loaded.items():
+            stay = []
+            for r in records:
+                if predicate(r):
+                    dirty.add(rollup.record_day(r))
+                    r.update(changes)
+                    dirty.add(rollup.record_day(r))
+                    updated.append(r)
+                    touched.add(seg)
+                    if _segment_of(r) != seg:
+                        moved.append(r)
+                        continue
+                stay.append(r)
+            loaded[seg] = stay
+        for r in moved:
+            seg = _segment_of(r)
+            if seg not in loaded:
+                loaded[seg] = _load_segment(seg)
+            loaded[seg].append(r)
+            touched.add(seg)
+        if updated:
+            _rewrite_segments({seg: loaded[seg] for seg in touched}, dirty=dirty)
+        weights = [r for r in read_weights(start, end) if predicate(r)]
+        for r in weights:
+            r.update(changes)
+        if weights:
+            weightlog.apply([("put", r) for r in weights])
+            updated.extend(weights)
+    return updated
+
+def read_range(start=None, end=None, types=None, packed: bool = False):
+    """Records whose day falls in [start, end], reading only the segments that overlap it.
+
+    Weights, when asked for, come from the weight series after the rest.
+    """
+    return list(iter_range(start, end, types, packed))
+
+def iter_range(start=None, end=None, types=None, packed: bool = False):
+    """read_range as a generator, folding one segment at a time."""
+    lo = _iso(start)
+    hi = _iso(end)
+    if not types or set(types) - {'weight'}:
+        segs = _segments_for(lo, hi)
+        pending = _pending()
+        if pending:
+            # _read_folded merges every pending write in one pass.
+            batches = [set(segs) | {seg for seg, _, _ in pending if _month_overlaps(seg, lo, hi)}]
+        else:
+            batches = [[seg] for seg in segs]
+        for batch in batches:
+            for r in _read_folded(batch, packed):
+                if types and r.get('type') not in types:
+                    continue
+                day = _record_day(r)
+                if (lo and (not day or day < lo)) or (hi and (not day or day > hi)):
+                    continue
+                yield r
+    if not types or 'weight' in types:
+        yield from read_weights(start, end, packed)
+
+def _read_ids(hits, packed: bool = False) -> list:
+    """The records for (id, day) pairs, seeking to each through its segment's offset index."""
+    by_seg = {}
+    for rec_id, day in hits:
+        by_seg.setdefault(day[:7], []).append(rec_id)
+    out = []
+    for seg in sorted(by_seg):
+        offsets, _ = _index(seg)
+        spans = sorted(offsets[i] for i in by_seg[seg] if i in offsets)
+        with _segment_path(seg).open("rb") as f:
+            for offset, length in spans:
+                f.seek(offset)
+                try:
+                    rec = json.loads(f.read(length))
+                except json.JSONDecodeError:
+                    continue
+                if rec.get('op') == OP_UPDATE:
+                    rec = rec['rec']
+                out.append(pack_record(rec) if packed else rec)
+    return out
+
+@metrics.timed("journal.search")
+def search(query: str, start=None, end=None, types=None, packed: bool = False) -> list:
+    """Tracker entries whose description matches query (see textindex), in journal order.
+
+    Served from the text index kept alongside the journal, reading only the
+    matching lines.
+    """
+    lo, hi = _iso(start), _iso(end)
+    # A few months of segments parse faster than the whole text index loads.
+    if _pending() or (lo and hi and len(_segments_for(lo, hi)) <= SEARCH_SCAN_SEGMENTS):
+        return [r for r in read_range(start, end, types or textindex.INDEXED_TYPES, packed)
+                if textindex.matches(query, r.get('description', ''))]
+    index = textindex.current(_journal_size(), lo, hi)
+    if index is None:
+        with _writing():
+            index = textindex.refresh(
+                _journal_size(), lo, hi,
+                lambda: read_all_records(packed=True),
+                lambda a, b: read_range(date.fromisoformat(a), date.fromisoformat(b), textindex.INDEXED_TYPES, packed=True),
+            )
+    hits = textindex.search(index, query, lo, hi, types)
+    metrics.count("journal.search_hits", len(hits))
+    records = _read_ids(hits, packed)
+    # Both indexes are derived from the segments; check the records
+    # themselves in case either lags an edit made behind their back.
+    out = []
+    for r in records:
+        day = _record_day(r)
+        if not day or (lo and day < lo) or (hi and day > hi) or (types and r.get('type') not in types):
+            continue
+        if textindex.matches(query, r.get('description', '')):
+            out.append(r)
+    return out
+
+@metrics.timed("journal.read_weights")
+def read_weights(start=None, end=None, packed: bool = False):
+    """Weigh-ins on days in [start, end] in ts order, by binary search over the weight series."""
+    _migrate()
+    recs = weightlog.read_range(start, end)
+    ops = getattr(_txn, 'weights', None)
+    if ops:
+        lo, hi = _iso(start), _iso(end)
+        by_id = {r['id']: r for r in recs}
+        for op, value in ops:
+            if op == "delete":
+                by_id.pop(value, None)
+            elif (lo and value['ts'][:10] < lo) or (hi and value['ts'][:10] > hi):
+                by_id.pop(value['id'], None)
+            else:
+                by_id[value['id']] = value
+        recs = sorted(by_id.values(), key=lambda r: r['ts'])
+    metrics.count("journal.weights_read", len(recs))
+    if packed:
+        return [pack_record(r) for r in recs]
+    return [dict(r) for r in recs]
+
+def read_daily_totals(start=None, end=None):
+    """Per-day totals for [start, end] from the rollup kept alongside the journal."""
+    def load_range(lo, hi):
+        return read_range(date.fromisoformat(lo), date.fromisoformat(hi), rollup.ROLLUP_TYPES, packed=True)
+
+    if _pending():
+        return rollup.build(read_range(start, end, rollup.ROLLUP_TYPES))
+    lo, hi = _iso(start), _iso(end)
+    days = rollup.current(_journal_size(), lo, hi)
+    if days is not None:
+        return days
+    with _writing():
+        return rollup.read(_journal_size(), lo, hi, lambda: read_all_records(packed=True), load_range)
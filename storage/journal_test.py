@@ -0,0 +1,126 @@
+import os
+import subprocess
+import sys
+
+SCRIPT = """
+from datetime import date
+from caltrack.storage import journal
+for i in range(40):
+    journal.append_record({"id": f"{i:08x}", "type": "food", "date": f"2024-0{1 + i % 3}-1{i % 10}",
+                           "meal": "lunch", "description": "greek yogurt" if i % 2 else "toast", "kcal": 100})
+journal.SEARCH_SCAN_SEGMENTS = 0
+# The first reads bring the rollup and text index up to date, which saves them.
+before = journal.read_daily_totals(), len(journal.search("yog"))
+
+def locked():
+    raise AssertionError("took the journal lock")
+journal._writing = locked
+assert (journal.read_daily_totals(), len(journal.search("yog"))) == before, before
+print(before[1], sum(day["food"] for day in before[0].values()))
+"""
+
+def test_current_rollup_and_index_are_read_without_the_lock(tmp_path):
+    env = dict(os.environ, HOME=str(tmp_path))
+    proc = subprocess.run([sys.executable, "-c", SCRIPT], env=env, capture_output=True, text=True)
+    assert proc.returncode == 0, proc.stderr
+    assert proc.stdout.split() == ["20", "4000"]
+
+ROLLUP_SCRIPT = """
+from caltrack.storage import journal, rollup
+def add(i):
+    journal.append_record({"id": f"{i:08x}", "type": "food", "date": f"2024-01-{1 + i % 9:02d}",
+                           "meal": "lunch" if i % 3 else "dinner", "description": "toast", "kcal": 10 * i})
+for i in range(10):
+    add(i)
+journal.read_daily_totals()
+saved = rollup.ROLLUP.stat().st_mtime_ns
+for i in range(10, 30):
+    add(i)
+journal.update_records(lambda r: r["id"] == f"{3:08x}", {"kcal": 999})
+journal.delete_records(lambda r: r["id"] == f"{4:08x}")
+# Writes only append to the log; the next read folds it in.
+assert rollup.ROLLUP.stat().st_mtime_ns == saved and rollup.ROLLUP_LOG.exists()
+assert journal.read_daily_totals() == rollup.build(journal.read_all_records())
+assert not rollup.ROLLUP_LOG.exists()
+"""
+
+def test_rollup_writes_are_logged_and_folded_on_read(tmp_path):
+    env = dict(os.environ, HOME=str(tmp_path))
+    proc = subprocess.run([sys.executable, "-c", ROLLUP_SCRIPT], env=env, capture_output=True, text=True)
+    assert proc.returncode == 0, proc.stderr
+
+DIRTY_DAY_SCRIPT = """
+from datetime import date
+from caltrack.storage import journal
+day, other = date(2024, 3, 5), date(2024, 4, 1)
+def add(i):
+    journal.append_record({"id": f"{i:08x}", "type": "food", "date": day.isoformat(),
+                           "meal": "lunch", "description": "toast", "kcal": 200})
+add(1)
+assert journal.read_daily_totals(day, day)[day.isoformat()]["food"] == 200
+journal.delete_records(lambda r: r["id"] == f"{1:08x}")
+journal.read_daily_totals(other, other)  # leaves the day dirty
+add(2)
+journal.delete_records(lambda r: r["id"] == f"{2:08x}")
+assert journal.read_daily_totals(day, day) == {}, journal.read_daily_totals(day, day)
+"""
+
+def test_a_day_emptied_while_dirty_drops_out_of_the_rollup(tmp_path):
+    env = dict(os.environ, HOME=str(tmp_path))
+    proc = subprocess.run([sys.executable, "-c", DIRTY_DAY_SCRIPT], env=env, capture_output=True, text=True)
+    assert proc.returncode == 0, proc.stderr
+
+TRANSACTION_SCRIPT = """
+from datetime import date
+from caltrack.domains import tracker
+from caltrack.storage import journal
+with journal.transaction():
+    tracker.add_food("00000001", date(2024, 1, 31), "lunch", "soup", 300)
+    tracker.update_entry("00000001", {"date": "2024-02-01"})
+    tracker.add_food("00000002", date(2024, 1, 31), "dinner", "toast", 100)
+    tracker.delete_entry("00000002")
+records = journal.read_all_records()
+assert [(r["id"], r["date"], r["kcal"]) for r in records] == [("00000001", "2024-02-01", 300)], records
+totals = journal.read_daily_totals()
+assert list(totals) == ["2024-02-01"] and totals["2024-02-01"]["food"] == 300, totals
+assert not journal.read_range(date(2024, 1, 1), date(2024, 1, 31))
+"""
+
+def test_transaction_add_then_move_or_delete(tmp_path):
+    env = dict(os.environ, HOME=str(tmp_path))
+    proc = subprocess.run([sys.executable, "-c", TRANSACTION_SCRIPT], env=env, capture_output=True, text=True)
+    assert proc.returncode == 0, proc.stderr
+
+SNAPSHOT_SCRIPT = """
+import os
+from caltrack.storage import journal
+for i in range(200):
+    journal.append_record({"id": f"{i:08x}", "type": "food", "date": "2024-01-05",
+                           "meal": "lunch", "description": "toast", "kcal": 300})
+path = journal._segment_path("2024-01")
+
+def load():
+    journal._cache.clear()
+    return journal._load_segment("2024-01")
+
+def snapshot_used():
+    with path.open("rb") as f:
+        return journal._load_snapshot("2024-01", f) is not None
+
+assert len(load()) == 200 and snapshot_used()
+journal.append_record({"id": "ffffffff", "type": "food", "date": "2024-01-06",
+                       "meal": "dinner", "description": "soup", "kcal": 100})
+assert snapshot_used() and len(load()) == 201
+# Same length, same inode, inside the snapshotted bytes: the snapshot is stale.
+with path.open("r+b") as f:
+    data = f.read()
+    f.seek(data.index(b'"kcal": 300'))
+    f.write(b'"kcal": 999')
+assert not snapshot_used()
+assert sum(r["kcal"] for r in load()) == 199 * 300 + 999 + 100
+"""
+
+def test_snapshot_is_rejected_after_an_in_place_edit(tmp_path):
+    env = dict(os.environ, HOME=str(tmp_path), CALTRACK_SNAPSHOT_TAIL_BYTES="1024")
+    proc = subprocess.run([sys.executable, "-c", SNAPSHOT_SCRIPT], env=env, capture_output=True, text=True)
+    assert proc.returncode == 0, proc.stderr
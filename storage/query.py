@@ -0,0 +1,162 @@
+from datetime import date, datetime
+from typing import Dict, Iterator, NamedTuple, Optional, Tuple
+from caltrack import metrics
+from caltrack.storage import backend as storage
+from caltrack.storage.records import pack as pack_record
+from caltrack.storage.textindex import matches as text_matches
+
+# Queries over the storage backend written as a models.Target and/or a
+# models.Range (or a (start, end) pair of dates). plan() turns them into a
+# Plan that says which index answers it:
+#   id       - the record itself, through the backend's id lookup
+#   search   - a contains filter, through the text index
+#   weights  - weigh-ins only, through the ts-sorted weight series
+#   range    - everything else, reading only the segments the dates touch
+#   empty    - nothing can match (an empty span, contains on weights)
+# records() streams the matches; bounds() and counts() answer from the
+# rollup and the weight series where they can, without building the records.
+# Target and Range are only read through their attributes, so this module
+# doesn't need pydantic.
+
+TRACKER_TYPES = ('food', 'activity', 'fluid')
+ALL_TYPES = TRACKER_TYPES + ('weight',)
+
+class Plan(NamedTuple):
+    source: str
+    id: Optional[str]
+    start: Optional[date]
+    end: Optional[date]
+    types: Tuple[str, ...]
+    contains: Optional[str]
+
+def parse_range(value: str) -> Tuple[date, date]:
+    """(start, end) for "YYYY-MM-DD", "A to B" / "A..B" / "A/B", or any date dateutil understands."""
+    try:
+        if any(sep in value for sep in ('..', '…', ' to ', '/')):
+            parts = [p.strip() for p in value.replace('…', '..').replace(' to ', '..').replace('/', '..').split('..')]
+            return date.fromisoformat(parts[0]), date.fromisoformat(parts[1])
+        d = date.fromisoformat(value)
+        return d, d
+    except ValueError:
+        from dateutil import parser as dateparser
+        d = dateparser.parse(value, default=datetime.now()).date()
+        return d, d
+
+def _parse(value: str) -> Tuple[date, date]:
+    try:
+        return parse_range(value)
+    except (ValueError, OverflowError):  # dateutil's ParserError is a ValueError
+        raise ValueError(f"invalid date: {value!r}") from None
+
+def span(rng=None, target=None) -> Tuple[Optional[date], Optional[date]]:
+    """The days rng covers, narrowed to target.date when the target has one.
+
+    rng is a Range or an already resolved (start, end) pair. Raises
+    ValueError("invalid date: ...") for a value that can't be read as dates.
+    """
+    start = end = None
+    if isinstance(rng, tuple):
+        start, end = rng
+    elif rng is not None and rng.value:
+        start, end = _parse(rng.value)
+    day = getattr(target, 'date', None)
+    if day:
+        lo, hi = _parse(day)
+        start = max(start, lo) if start else lo
+        end = min(end, hi) if end else hi
+    return start, end
+
+def plan(target=None, rng=None, types=ALL_TYPES) -> Plan:
+    """Choose the index that answers target/rng; types limits the record types considered."""
+    type_ = getattr(target, 'type', None)
+    types = tuple(t for t in types if not type_ or t == type_)
+    rec_id = getattr(target, 'id', None)
+    contains = getattr(target, 'contains', None)
+    start, end = span(rng, target)
+    if contains:
+        # Only tracker entries have descriptions.
+        types = tuple(t for t in types if t in TRACKER_TYPES)
+    if not types or (start and end and start > end):
+        source = 'empty'
+    elif rec_id:
+        source = 'id'
+    elif contains:
+        source = 'search'
+    elif types == ('weight',):
+        source = 'weights'
+    else:
+        source = 'range'
+    return Plan(source, rec_id, start, end, types, contains)
+
+def _day(rec) -> Optional[str]:
+    day = rec.get('date') or rec.get('ts')
+    return day[:10] if day else None
+
+def _matches(p: Plan, rec) -> bool:
+    if rec.get('type') not in p.types:
+        return False
+    day = _day(rec)
+    if (p.start and (not day or day < p.start.isoformat())) or (p.end and (not day or day > p.end.isoformat())):
+        return False
+    return not p.contains or text_matches(p.contains, rec.get('description', ''))
+
+def records(target=None, rng=None, types=ALL_TYPES, packed: bool = True) -> Iterator:
+    """Yield the records matching target/rng, as compact read-only records unless packed=False."""
+    return _run(plan(target, rng, types), packed)
+
+def _run(p: Plan, packed: bool = True) -> Iterator:
+    metrics.count(f"query.{p.source}")
+    if p.source == 'id':
+        rec = storage.read_record(p.id)
+        if rec is not None and _matches(p, rec):
+            yield pack_record(rec) if packed else rec
+    elif p.source == 'search':
+        yield from storage.search(p.contains, p.start, p.end, p.types, packed)
+    elif p.source == 'weights':
+        yield from storage.read_weights(p.start, p.end, packed)
+    elif p.source == 'range':
+        yield from storage.iter_range(p.start, p.end, p.types, packed)
+
+def _rollup_days(p: Plan) -> Dict[str, Dict[str, int]]:
+    """{ISO day: {type: count}} of the plan's tracker types, from the rollup."""
+    out = {}
+    if not set(p.types) & set(TRACKER_TYPES):
+        return out
+    for key, day in storage.read_daily_totals(p.start, p.end).items():
+        counts = {t: n for t, n in day['counts'].items() if n and t in p.types}
+        if counts:
+            out[key] = counts
+    return out
+
+def bounds(target=None, rng=None, types=ALL_TYPES) -> Tuple[Optional[date], Optional[date]]:
+    """The first and last day with a matching record, or (None, None) when nothing matches."""
+    p = plan(target, rng, types)
+    if p.source in ('id', 'search'):
+        days = [_day(r) for r in _run(p)]
+    elif p.source == 'empty':
+        days = []
+    else:
+        days = list(_rollup_days(p))
+        if 'weight' in p.types:
+            days.extend(_day(w) for w in storage.read_weights(p.start, p.end))
+    days = [d for d in days if d]
+    if not days:
+        return None, None
+    return date.fromisoformat(min(days)), date.fromisoformat(max(days))
+
+def counts(target=None, rng=None, types=ALL_TYPES) -> Dict[str, int]:
+    """How many records of each type match, e.g. {"food": 812, "fluid": 240}."""
+    p = plan(target, rng, types)
+    out: Dict[str, int] = {}
+    if p.source in ('id', 'search'):
+        for r in _run(p):
+            out[r['type']] = out.get(r['type'], 0) + 1
+    elif p.source != 'empty':
+        for day in _rollup_days(p).values():
+            for t, n in day.items():
+                out[t] = out.get(t, 0) + n
+        if 'weight' in p.types:
+            weights = len(storage.read_weights(p.start, p.end))
+            if weights:
+                out['weight'] = weights
+    return out
@@ -0,0 +1,16 @@
+from types import SimpleNamespace
+import pytest
+from caltrack.storage import query
+
+@pytest.mark.parametrize("value", ["not a date", "2024-13-45", "99999999999999999999"])
+def test_span_rejects_unreadable_dates(value):
+    with pytest.raises(ValueError, match="invalid date"):
+        query.span(None, SimpleNamespace(date=value))
+    with pytest.raises(ValueError, match="invalid date"):
+        query.span(SimpleNamespace(value=value))
+
+def test_execute_reports_an_invalid_target_date(capsys):
+    from caltrack import cli
+    from caltrack.models import Command, Target
+    assert cli.execute(Command(action='read', target=Target(date='not a date'))) is False
+    assert capsys.readouterr().out == "ERROR: invalid date: 'not a date'\n"
@@ -0,0 +1,84 @@
+import sys
+from collections.abc import Mapping
+
+# Compact, read-only stand-ins for the record dicts produced by json.loads.
+# A dict per record costs several hundred bytes before counting its strings;
+# these keep the fields in __slots__ and share repeated strings (dates,
+# meals, descriptions) through sys.intern. They read like the dicts they
+# replace (rec['kcal'], rec.get('meal', ...), dict(rec)) so the domains,
+# summary and rollup code consume either. Anything that mutates or
+# serializes a record wants the dict: use to_dict().
+
+_INTERNED = frozenset(('date', 'description', 'meal'))
+
+class Record(Mapping):
+    __slots__ = ()
+    type = None
+    KEYS = ()
+
+    def __init__(self, rec: dict):
+        for key in self.__slots__:
+            value = rec[key]
+            if key in _INTERNED and type(value) is str:
+                value = sys.intern(value)
+            object.__setattr__(self, key, value)
+
+    def __setattr__(self, key, value):
+        raise AttributeError(f"{type(self).__name__} is read-only; use to_dict()")
+
+    def __getitem__(self, key):
+        if key in self._keyset:
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        if key in self._keyset:
+            return getattr(self, key)
+        return default
+
+    def __contains__(self, key):
+        return key in self._keyset
+
+    def __iter__(self):
+        return iter(self.KEYS)
+
+    def __len__(self):
+        return len(self.KEYS)
+
+    def to_dict(self) -> dict:
+        return {key: getattr(self, key) for key in self.KEYS}
+
+    def __repr__(self):
+        return repr(self.to_dict())
+
+class FoodRecord(Record):
+    __slots__ = ('id', 'date', 'description', 'meal', 'kcal')
+    type = 'food'
+    KEYS = ('id', 'date', 'type', 'description', 'meal', 'kcal')
+
+class ActivityRecord(Record):
+    __slots__ = ('id', 'date', 'description', 'kcal_burned')
+    type = 'activity'
+    KEYS = ('id', 'date', 'type', 'description', 'kcal_burned')
+
+class FluidRecord(Record):
+    __slots__ = ('id', 'date', 'description', 'volume_ml')
+    type = 'fluid'
+    KEYS = ('id', 'date', 'type', 'description', 'volume_ml')
+
+class WeightRecord(Record):
+    __slots__ = ('id', 'ts', 'kg')
+    type = 'weight'
+    KEYS = ('id', 'type', 'ts', 'kg')
+
+_BY_TYPE = {}
+for _cls in (FoodRecord, ActivityRecord, FluidRecord, WeightRecord):
+    _cls._keyset = frozenset(_cls.KEYS)
+    _BY_TYPE[_cls.type] = _cls
+
+def pack(rec: dict):
+    """The compact form of rec, or rec itself when it has fields outside its type's shape."""
+    cls = _BY_TYPE.get(rec.get('type'))
+    if cls is None or rec.keys() != cls._keyset:
+        return rec
+    return cls(rec)
@@ -0,0 +1,114 @@
+from pathlib import Path
+from caltrack.storage.derived import DerivedFile, in_range
+
+ROLLUP = Path.home() / ".caltrack" / "rollup.json"
+ROLLUP_LOG = ROLLUP.with_suffix(".log")  # see storage/derived.py
+
+# Materialized per-day totals for the tracker types, keyed by ISO date:
+#   {"counts": {type: n}, "food": kcal, "activity": kcal, "fluids_ml": ml,
+#    "meals": {meal: kcal}, "fluids": {description: ml}}
+# Meals and fluids keep the order they were first logged in, which is the
+# order the summary prints them. The file also records the journal size it
+# covers and the dates whose totals were invalidated by an update or delete,
+# and is kept up to date through ROLLUP_LOG (see storage/derived.py), whose
+# lines are
+#   {"before": n, "after": n, "added": [{the fields apply() reads}], "dirty": [day]}
+ROLLUP_TYPES = ('food', 'activity', 'fluid')
+LOG_LIMIT = 1024 * 1024
+_FIELDS = ('type', 'date', 'meal', 'kcal', 'kcal_burned', 'description', 'volume_ml')
+
+def _empty_day() -> dict:
+    return {"counts": {}, "food": 0, "activity": 0, "fluids_ml": 0, "meals": {}, "fluids": {}}
+
+def record_day(rec: dict):
+    if rec.get('type') not in ROLLUP_TYPES or not rec.get('date'):
+        return None
+    return rec['date'][:10]
+
+def apply(days: dict, rec: dict):
+    """Fold one record's contribution into the per-day totals."""
+    key = record_day(rec)
+    if key is None:
+        return
+    day = days.setdefault(key, _empty_day())
+    t = rec['type']
+    day['counts'][t] = day['counts'].get(t, 0) + 1
+    if t == 'food' and rec.get('kcal') is not None:
+        meal = rec.get('meal', 'unspecified')
+        day['food'] += rec['kcal']
+        day['meals'][meal] = day['meals'].get(meal, 0) + rec['kcal']
+    elif t == 'activity' and rec.get('kcal_burned') is not None:
+        day['activity'] += rec['kcal_burned']
+    elif t == 'fluid' and rec.get('volume_ml') is not None:
+        desc = rec.get('description', 'unspecified')
+        day['fluids_ml'] += rec['volume_ml']
+        day['fluids'][desc] = day['fluids'].get(desc, 0) + rec['volume_ml']
+
+def build(records) -> dict:
+    days = {}
+    for rec in records:
+        apply(days, rec)
+    return days
+
+def _empty() -> dict:
+    return {"size": None, "days": {}, "dirty": []}
+
+def _fold(state: dict, write: dict):
+    for rec in write['added']:
+        apply(state['days'], rec)
+    for key in write['dirty']:
+        # Drop the day even if it's already dirty: records added since hold partial totals.
+        state['days'].pop(key, None)
+        if key not in state['dirty']:
+            state['dirty'].append(key)
+
+_store = DerivedFile(ROLLUP, _empty, _fold, LOG_LIMIT)
+
+def update(size_before: int, size_after: int, added=(), dirty=()):
+    """Log a journal write that moved it from size_before to size_after.
+
+    Appended records are folded in on the next read; dates in `dirty` are
+    dropped then and recomputed. If the rollup didn't cover the journal as
+    it was before the write, the next read rebuilds it.
+    """
+    _store.append({"before": size_before, "after": size_after,
+                   "added": [{k: rec.get(k) for k in _FIELDS if rec.get(k) is not None}
+                             for rec in added if record_day(rec) is not None],
+                   "dirty": [key for key in dirty if key]})
+
+def _within(days: dict, start: str, end: str) -> dict:
+    return {k: v for k, v in days.items() if in_range(k, start, end)}
+
+def current(size: int, start: str, end: str):
+    """Totals for [start, end] if the saved rollup already covers a journal of `size`, else None.
+
+    Only reads, so it needs no lock; otherwise read() brings the rollup up to date.
+    """
+    state = _store.current(size, start, end)
+    return None if state is None else _within(state['days'], start, end)
+
+def read(size: int, start: str, end: str, load_all, load_range) -> dict:
+    """Per-day totals for ISO dates in [start, end] (either may be None).
+
+    load_all() returns every folded record and is only used for a full
+    rebuild; load_range(lo, hi) returns the records for a date span and is
+    used to refresh invalidated dates. The caller holds the journal lock,
+    since this may save the rollup.
+    """
+    state, changed = _store.replay()
+    if state['size'] != size:
+        state = {"size": size, "days": build(load_all()), "dirty": []}
+        changed = True
+    dirty = sorted(k for k in state['dirty'] if in_range(k, start, end))
+    if dirty:
+        fresh = build(r for r in load_range(dirty[0], dirty[-1]) if record_day(r) in dirty)
+        for key in dirty:
+            if key in fresh:
+                state['days'][key] = fresh[key]
+            else:
+                state['days'].pop(key, None)
+        state['dirty'] = [k for k in state['dirty'] if k not in dirty]
+        changed = True
+    if changed:
+        _store.save(state)
+    return _within(state['days'], start, end)
@@ -0,0 +1,229 @@
+import json
+import sqlite3
+from contextlib import contextmanager
+from datetime import date, timedelta
+from pathlib import Path
+from caltrack.storage import rollup, textindex
+from caltrack.storage.records import pack as pack_record
+
+DB_PATH = Path.home() / ".caltrack" / "caltrack.db"
+
+# Same record dicts as the NDJSON journal, stored whole in `body`. The other
+# columns are copies of the fields we filter on so they can be indexed; `seq`
+# keeps insertion order so reads come back in the order records were logged.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS records (
+    seq  INTEGER PRIMARY KEY AUTOINCREMENT,
+    id   TEXT NOT NULL,
+    type TEXT NOT NULL,
+    date TEXT,
+    ts   TEXT,
+    body TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_records_id ON records (id);
+CREATE INDEX IF NOT EXISTS idx_records_type_date ON records (type, date);
+CREATE INDEX IF NOT EXISTS idx_records_weight_ts ON records (ts) WHERE type = 'weight';
+"""
+
+_conn = None
+_txn_depth = 0
+
+def _db() -> sqlite3.Connection:
+    global _conn
+    if _conn is None:
+        DB_PATH.parent.mkdir(exist_ok=True)
+        _conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+        _conn.executescript(SCHEMA)
+    return _conn
+
+@contextmanager
+def _writing():
+    """Commit after the block, unless an outer transaction() will do it."""
+    conn = _db()
+    if _txn_depth:
+        yield conn
+    else:
+        with conn:
+            yield conn
+
+@contextmanager
+def transaction():
+    """Apply every write in the block as one SQLite transaction."""
+    global _txn_depth
+    conn = _db()
+    _txn_depth += 1
+    try:
+        yield
+    except BaseException:
+        if _txn_depth == 1:
+            conn.rollback()
+        raise
+    else:
+        if _txn_depth == 1:
+            conn.commit()
+    finally:
+        _txn_depth -= 1
+
+def _columns(rec: dict):
+    day = rec.get('date') or rec.get('ts')
+    return (rec['id'], rec['type'], day[:10] if day else None, rec.get('ts'), json.dumps(rec))
+
+def append_record(rec: dict):
+    allowed_types = ('food', 'activity', 'fluid', 'weight')
+    if rec['type'] not in allowed_types:
+        raise ValueError(f"Unknown record type: {rec['type']}")
+    with _writing() as conn:
+        conn.execute("INSERT INTO records (id, type, date, ts, body) VALUES (?, ?, ?, ?, ?)", _columns(rec))
+
+def append_records(recs) -> None:
+    for rec in recs:
+        if rec['type'] not in ('food', 'activity', 'fluid', 'weight'):
+            raise ValueError(f"Unknown record type: {rec['type']}")
+    with _writing() as conn:
+        conn.executemany("INSERT INTO records (id, type, date, ts, body) VALUES (?, ?, ?, ?, ?)", map(_columns, recs))
+
+def read_ids() -> set:
+    return {rec_id for (rec_id,) in _db().execute("SELECT id FROM records")}
+
+def _bodies(sql: str, params=(), packed: bool = False):
+    if packed:
+        return [pack_record(json.loads(body)) for (body,) in _db().execute(sql, params)]
+    return [json.loads(body) for (body,) in _db().execute(sql, params)]
+
+def read_all_records(packed: bool = False):
+    return _bodies("SELECT body FROM records ORDER BY seq", packed=packed)
+
+def read_record(rec_id: str):
+    rows = _bodies("SELECT body FROM records WHERE id = ? ORDER BY seq DESC LIMIT 1", (rec_id,))
+    return rows[0] if rows else None
+
+def replace_record(rec_id: str, rec: dict) -> dict:
+    rec.setdefault('id', rec_id)
+    with _writing() as conn:
+        cur = conn.execute(
+            "UPDATE records SET id = ?, type = ?, date = ?, ts = ?, body = ? WHERE id = ?",
+            _columns(rec) + (rec_id,),
+        )
+    if not cur.rowcount:
+        raise KeyError(f"Entry {rec_id} not found")
+    return rec
+
+def remove_record(rec_id: str):
+    old = read_record(rec_id)
+    if old is None:
+        return None
+    with _writing() as conn:
+        conn.execute("DELETE FROM records WHERE id = ?", (rec_id,))
+    return old
+
+def _matching(predicate, start: date = None, end: date = None):
+    sql = "SELECT seq, body FROM records"
+    clauses, params = [], []
+    if start:
+        clauses.append("date >= ?")
+        params.append(start.isoformat())
+    if end:
+        clauses.append("date <= ?")
+        params.append(end.isoformat())
+    if clauses:
+        sql += " WHERE " + " AND ".join(clauses)
+    rows = ((seq, json.loads(body)) for seq, body in _db().execute(sql + " ORDER BY seq", params))
+    return [(seq, r) for seq, r in rows if predicate(r)]
+
+def delete_records(predicate, start: date = None, end: date = None) -> list:
+    matches = _matching(predicate, start, end)
+    with _writing() as conn:
+        conn.executemany("DELETE FROM records WHERE seq = ?", [(seq,) for seq, _ in matches])
+    return [r for _, r in matches]
+
+def update_records(predicate, changes: dict, start: date = None, end: date = None) -> list:
+    matches = _matching(predicate, start, end)
+    with _writing() as conn:
+        for seq, r in matches:
+            r.update(changes)
+            conn.execute(
+                "UPDATE records SET id = ?, type = ?, date = ?, ts = ?, body = ? WHERE seq = ?",
+                _columns(r) + (seq,),
+            )
+    return [r for _, r in matches]
+
+def read_range(start: date = None, end: date = None, types=None, packed: bool = False):
+    """Records whose day falls in [start, end], served from the (type, date) index."""
+    return list(iter_range(start, end, types, packed))
+
+def iter_range(start: date = None, end: date = None, types=None, packed: bool = False):
+    """read_range as a generator over the open cursor."""
+    types = tuple(types or ('food', 'activity', 'fluid', 'weight'))
+    sql = f"SELECT body FROM records WHERE type IN ({', '.join('?' * len(types))})"
+    params = list(types)
+    if start:
+        sql += " AND date >= ?"
+        params.append(start.isoformat())
+    if end:
+        sql += " AND date <= ?"
+        params.append(end.isoformat())
+    for (body,) in _db().execute(sql + " ORDER BY seq", params):
+        yield pack_record(json.loads(body)) if packed else json.loads(body)
+
+def read_weights(start: date = None, end: date = None, packed: bool = False):
+    """Weight records with ts in [start, end], served from the weight ts index."""
+    sql = "SELECT body FROM records WHERE type = 'weight'"
+    params = []
+    if start:
+        sql += " AND ts >= ?"
+        params.append(start.isoformat())
+    if end:
+        sql += " AND ts < ?"
+        params.append((end + timedelta(days=1)).isoformat())
+    return _bodies(sql + " ORDER BY seq", params, packed)
+
+def search(query: str, start: date = None, end: date = None, types=None, packed: bool = False):
+    """Tracker entries whose description matches query, as textindex.matches decides.
+
+    Each ASCII query token narrows the rows with a LIKE on the stored body
+    (bodies are JSON with non-ASCII escaped) before the token-prefix check
+    runs on what is left.
+    """
+    types = tuple(types or textindex.INDEXED_TYPES)
+    sql = f"SELECT body FROM records WHERE type IN ({', '.join('?' * len(types))})"
+    params = list(types)
+    if start:
+        sql += " AND date >= ?"
+        params.append(start.isoformat())
+    if end:
+        sql += " AND date <= ?"
+        params.append(end.isoformat())
+    for token in filter(str.isascii, textindex.tokens(query)):
+        sql += " AND body LIKE ?"
+        params.append(f"%{token}%")
+    return [r for r in _bodies(sql + " ORDER BY seq", params, packed)
+            if textindex.matches(query, r.get('description', ''))]
+
+def read_daily_totals(start: date = None, end: date = None):
+    return rollup.build(read_range(start, end, rollup.ROLLUP_TYPES, packed=True))
+
+def migrate_from_ndjson() -> int:
+    """Copy the NDJSON journal and weights.ndjson into the database, skipping ids already present."""
+    from caltrack.storage import journal, weightlog
+
+    records = journal.read_all_records()
+    if weightlog.WEIGHT_FILE.exists():
+        records += [dict(w, type='weight') for w in weightlog.read_all() if 'id' in w and 'ts' in w]
+    existing = {rec_id for (rec_id,) in _db().execute("SELECT id FROM records")}
+    rows = []
+    for rec in records:
+        if rec.get('id') in existing or rec.get('type') not in ('food', 'activity', 'fluid', 'weight'):
+            continue
+        existing.add(rec['id'])
+        rows.append(_columns(rec))
+    with _writing() as conn:
+        conn.executemany("INSERT INTO records (id, type, date, ts, body) VALUES (?, ?, ?, ?, ?)", rows)
+    return len(rows)
+
+def main():
+    count = migrate_from_ndjson()
+    print(f"✔ migrated {count} records into {DB_PATH}")
+    print("Set CALTRACK_BACKEND=sqlite (or \"backend\": \"sqlite\" in ~/.caltrack/config.json) to use it.")
+
+if __name__ == "__main__":
+    main()
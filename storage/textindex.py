@@ -0,0 +1,152 @@
+import re
+from bisect import bisect_left
+from pathlib import Path
+from caltrack.storage.derived import DerivedFile, in_range
+from caltrack.storage.rollup import record_day
+
+TEXT_INDEX = Path.home() / ".caltrack" / "textindex.json"
+TEXT_INDEX_LOG = TEXT_INDEX.with_suffix(".log")  # see storage/derived.py
+
+# Token -> entry ids over the tracker entries' descriptions, kept next to the
+# journal the same way the rollup is (see storage/derived.py):
+#   {"size": n, "docs": {id: [day, type, description]},
+#    "terms": {token: [id, ...]}, "dirty": [day, ...]}
+# with TEXT_INDEX_LOG lines
+#   {"before": n, "after": n, "added": [[id, day, type, description]], "dirty": [day]}
+LOG_LIMIT = 4 * 1024 * 1024
+# A query matches a description when every query token is a prefix of one of
+# its tokens, so "greek yog" finds "Greek yogurt, honey".
+INDEXED_TYPES = ('food', 'activity', 'fluid')
+
+_TOKEN = re.compile(r"[^\W_]+")
+
+def tokens(text: str) -> list:
+    return _TOKEN.findall(text.lower()) if text else []
+
+def matches(query: str, text: str) -> bool:
+    words = tokens(text)
+    return all(any(w.startswith(q) for w in words) for q in tokens(query))
+
+def _empty() -> dict:
+    return {"size": None, "docs": {}, "terms": {}, "dirty": []}
+
+def _drop(state: dict, rec_id: str):
+    doc = state['docs'].pop(rec_id, None)
+    if doc is None:
+        return
+    for token in set(tokens(doc[2])):
+        ids = state['terms'].get(token)
+        if ids is None:
+            continue
+        ids = [i for i in ids if i != rec_id]
+        if ids:
+            state['terms'][token] = ids
+        else:
+            del state['terms'][token]
+
+def _doc(rec):
+    """[id, day, type, description] for an indexed record, else None."""
+    if rec.get('type') not in INDEXED_TYPES or not rec.get('description'):
+        return None
+    day = record_day(rec)
+    if day is None:
+        return None
+    return [rec['id'], day, rec['type'], rec['description']]
+
+def _add(state: dict, doc):
+    rec_id, day, type_, description = doc
+    _drop(state, rec_id)
+    state['docs'][rec_id] = [day, type_, description]
+    for token in set(tokens(description)):
+        state['terms'].setdefault(token, []).append(rec_id)
+
+def build(records) -> dict:
+    state = _empty()
+    for rec in records:
+        doc = _doc(rec)
+        if doc is not None:
+            _add(state, doc)
+    return state
+
+def _fold(state: dict, write: dict):
+    for doc in write['added']:
+        _add(state, doc)
+    for key in write['dirty']:
+        if key not in state['dirty']:
+            state['dirty'].append(key)
+
+_store = DerivedFile(TEXT_INDEX, _empty, _fold, LOG_LIMIT)
+
+def update(size_before: int, size_after: int, added=(), dirty=()):
+    """Log a journal write that moved it from size_before to size_after (see rollup.update)."""
+    _store.append({"before": size_before, "after": size_after,
+                   "added": [doc for doc in map(_doc, added) if doc is not None],
+                   "dirty": [key for key in dirty if key]})
+
+# The sorted vocabulary of the last state searched, for prefix lookups.
+_vocab_cache = {"state": None, "vocab": None}
+
+def _vocab(state: dict) -> list:
+    if _vocab_cache["state"] is not state:
+        _vocab_cache.update(state=state, vocab=sorted(state['terms']))
+    return _vocab_cache["vocab"]
+
+def _postings(state: dict, prefix: str) -> set:
+    vocab = _vocab(state)
+    ids = set()
+    i = bisect_left(vocab, prefix)
+    while i < len(vocab) and vocab[i].startswith(prefix):
+        ids.update(state['terms'][vocab[i]])
+        i += 1
+    return ids
+
+def current(size: int, start: str, end: str):
+    """The saved index if it already covers a journal of `size` for [start, end], else None.
+
+    Only reads, so it needs no lock; otherwise refresh() brings the index up to date.
+    """
+    return _store.current(size, start, end)
+
+def refresh(size: int, start: str, end: str, load_all, load_range) -> dict:
+    """The index folded up to a journal of `size`, with the invalidated days in [start, end] recomputed.
+
+    load_all and load_range are as for rollup.read: a full rebuild, and a
+    refresh of the invalidated days the search covers. The caller holds the
+    journal lock, since this saves the index and clears the log.
+    """
+    state, changed = _store.replay()
+    if state['size'] != size:
+        state = build(load_all())
+        state['size'] = size
+        changed = True
+    dirty = sorted(k for k in state['dirty'] if in_range(k, start, end))
+    if dirty:
+        wanted = set(dirty)
+        for rec_id in [i for i, doc in state['docs'].items() if doc[0] in wanted]:
+            _drop(state, rec_id)
+        for rec in load_range(dirty[0], dirty[-1]):
+            doc = _doc(rec)
+            if doc is not None and doc[1] in wanted:
+                _add(state, doc)
+        state['dirty'] = [k for k in state['dirty'] if k not in wanted]
+        changed = True
+    if changed:
+        _store.save(state)
+    return state
+
+def search(state: dict, query: str, start: str, end: str, types) -> list:
+    """(id, day) of entries in state matching query with ISO day in [start, end], sorted by day."""
+    ids = None
+    for prefix in tokens(query):
+        found = _postings(state, prefix)
+        ids = found if ids is None else ids & found
+        if not ids:
+            return []
+    out = []
+    for rec_id in ids or ():
+        day, type_, _ = state['docs'][rec_id]
+        if (start and day < start) or (end and day > end) or (types and type_ not in types):
+            continue
+        out.append((rec_id, day))
+    out.sort(key=lambda hit: hit[1])
+    return out
@@ -1,10 +1,20 @@
 import os
 import json
+from bisect import bisect_left
 from pathlib import Path
-from datetime import datetime
+from datetime import date, timedelta
+from caltrack.storage.derived import stat_key
 
 WEIGHT_FILE = Path.home() / ".caltrack" / "weights.ndjson"
 
+# The weight time series: one {"id", "type": "weight", "ts", "kg"} per line,
+# sorted by ts, so a date range is two binary searches over the loaded
+# timestamps instead of a scan of the tracker journal. Weigh-ins logged in
+# time order (the usual case) are appended; an earlier ts, an update or a
+# delete rewrites the file atomically with write_all. The NDJSON journal
+# routes every weight record here (see journal._migrate_weights) and holds
+# the lock around writes.
+
 def ensure_dir():
     WEIGHT_FILE.parent.mkdir(parents=True, exist_ok=True)
 
@@ -33,3 +43,72 @@ def write_all(records: list[dict]) -> None:
         f.flush()
         os.fsync(f.fileno())             # ensure it's on disk
     tmp.replace(WEIGHT_FILE)
+
+def _ts(rec: dict) -> str:
+    return rec['ts']
+
+# The parsed series and its ts keys, reused while the file is unchanged
+# (same inode, size and mtime), as journal._cache does for segments.
+_cache = {"key": None, "records": [], "keys": [], "ids": {}}
+
+def _load():
+    key = stat_key(WEIGHT_FILE)
+    if key is None:
+        return [], [], {}
+    if _cache["key"] != key:
+        # weights.ndjson predates this store and may be unsorted or lack
+        # the type field; the sort is stable, so same-ts order is kept.
+        records = sorted((dict(w, type='weight') for w in read_all() if 'id' in w and 'ts' in w), key=_ts)
+        _cache.update(key=key, records=records, keys=[r['ts'] for r in records],
+                      ids={r['id']: r for r in records})
+    return _cache["records"], _cache["keys"], _cache["ids"]
+
+def read_range(start: date = None, end: date = None) -> list:
+    """Weigh-ins with ts on a day in [start, end] (either may be None), oldest first.
+
+    The records are shared with the cache; copy before mutating.
+    """
+    records, keys, _ = _load()
+    lo = bisect_left(keys, start.isoformat()) if start else 0
+    hi = bisect_left(keys, (end + timedelta(days=1)).isoformat()) if end else len(keys)
+    return records[lo:hi]
+
+def find(rec_id: str):
+    return _load()[2].get(rec_id)
+
+def apply(ops) -> None:
+    """Apply ("put", record) and ("delete", id) operations in order.
+
+    A put replaces any record with the same id. When every op is a put of a
+    new id no earlier than the series' last ts, the records are appended;
+    otherwise the series is rewritten.
+    """
+    records, keys, ids = _load()
+    last = keys[-1] if keys else None
+    appends, new_ids = [], set()
+    for op, value in ops:
+        if op != "put" or value['id'] in ids or value['id'] in new_ids or (last is not None and value['ts'] < last):
+            break
+        last = value['ts']
+        appends.append(value)
+        new_ids.add(value['id'])
+    else:
+        if appends:
+            ensure_dir()
+            with WEIGHT_FILE.open("a") as f:
+                f.write("".join(json.dumps(r) + "\n" for r in appends))
+                f.flush()
+                os.fsync(f.fileno())
+        return
+    merged = dict(ids)
+    for op, value in ops:
+        if op == "put":
+            merged.pop(value['id'], None)
+            merged[value['id']] = value
+        else:
+            merged.pop(value, None)
+    write_all(sorted(merged.values(), key=_ts))
+
+def replace_all(records) -> None:
+    """Make the series exactly these weight records."""
+    write_all(sorted(records, key=_ts))
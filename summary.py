@@ -1,9 +1,36 @@
 # caltrack/summary.py
+import os
 from collections import defaultdict
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
+from caltrack import config, metrics
 
-def summarize_entries(entries, start_date, end_date, verbose=False):
-    daily_summary = defaultdict(lambda: {
+# numpy is optional and only worth importing for large inputs; see _load_numpy.
+np = None
+
+# Below this many entries the per-record loop is faster than building arrays.
+NUMPY_MIN_ENTRIES = 2000
+
+# From this many entries, and with more than one worker (summary_workers,
+# default: the CPU count), aggregation is split across a process pool;
+# smaller inputs stay serial rather than pay for starting the pool. Both
+# can be set in config.json or as CALTRACK_SUMMARY_* variables.
+DEFAULT_PARALLEL_MIN_ENTRIES = 100_000
+
+_TYPE_CODES = {'food': 0, 'activity': 1, 'fluid': 2}
+_VALUE_FIELDS = ('kcal', 'kcal_burned', 'volume_ml')
+
+def _load_numpy() -> bool:
+    global np
+    if np is None:
+        try:
+            import numpy
+        except ImportError:  # the pure-Python path handles everything
+            return False
+        np = numpy
+    return True
+
+def _new_daily_summary():
+    return defaultdict(lambda: {
         'food': 0,
         'activity': 0,
         'fluids_ml': 0,
@@ -12,6 +39,9 @@ def summarize_entries(entries, start_date, end_date, verbose=False):
         'fluid_groups': defaultdict(list)
     })
 
+def _aggregate(entries, start_date, end_date, verbose):
+    daily_summary = _new_daily_summary()
+
     for e in entries:
         e_date = datetime.fromisoformat(e['date']).date()
         if start_date <= e_date <= end_date:
@@ -30,6 +60,228 @@ def summarize_entries(entries, start_date, end_date, verbose=False):
                 fluid_group = e.get('description', 'unspecified')
                 daily_summary[e_date]['fluid_groups'][fluid_group].append(e)
 
+    return daily_summary
+
+def _columns(entries):
+    """Load entries into parallel arrays: day ordinal, type code, value, meal code.
+
+    Returns None when the data can't be represented exactly (non-integer
+    values, dates numpy can't parse), in which case the caller falls back
+    to the per-record path.
+    """
+    types, values, present, meals, days = [], [], [], [], []
+    meal_codes = {}
+    for e in entries:
+        t = _TYPE_CODES.get(e['type'], -1)
+        v = e.get(_VALUE_FIELDS[t]) if t >= 0 else None
+        if v is not None and type(v) is not int:
+            return None
+        types.append(t)
+        values.append(v or 0)
+        present.append(v is not None)
+        meals.append(meal_codes.setdefault(e.get('meal', 'unspecified'), len(meal_codes)) if t == 0 else -1)
+        days.append(e['date'][:10])
+    try:
+        days = np.array(days, dtype='datetime64[D]')
+    except ValueError:
+        return None
+    return (days.astype(np.int64), np.array(types, dtype=np.int8), np.array(values, dtype=np.int64),
+            np.array(present, dtype=bool), np.array(meals, dtype=np.int64), list(meal_codes))
+
+def _aggregate_numpy(entries, start_date, end_date, verbose):
+    cols = _columns(entries)
+    if cols is None:
+        return _aggregate(entries, start_date, end_date, verbose)
+    days, types, vals, present, meals, meal_names = cols
+
+    epoch = date(1970, 1, 1)
+    lo = (start_date - epoch).days
+    hi = (end_date - epoch).days
+    in_range = (days >= lo) & (days <= hi) & present & (types >= 0)
+    day_idx = days - lo
+    n_days = hi - lo + 1
+
+    daily_summary = _new_daily_summary()
+    totals = np.zeros((3, n_days), dtype=np.int64)
+    touched = np.zeros(n_days, dtype=bool)
+    for code in range(3):
+        mask = in_range & (types == code)
+        np.add.at(totals[code], day_idx[mask], vals[mask])
+        touched[day_idx[mask]] = True
+    for i in np.flatnonzero(touched).tolist():
+        day = daily_summary[start_date + timedelta(days=i)]
+        day['food'] = int(totals[0, i])
+        day['activity'] = int(totals[1, i])
+        day['fluids_ml'] = int(totals[2, i])
+
+    # Per-(day, meal) totals, emitted in order of first appearance so each
+    # day's meals come out in the same order as the per-record loop.
+    food = np.flatnonzero(in_range & (types == 0))
+    if food.size:
+        keys = day_idx[food] * len(meal_names) + meals[food]
+        uniq, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+        sums = np.zeros(uniq.size, dtype=np.int64)
+        np.add.at(sums, inverse, vals[food])
+        for k in np.argsort(first, kind='stable').tolist():
+            d, m = divmod(int(uniq[k]), len(meal_names))
+            daily_summary[start_date + timedelta(days=d)]['meals'][meal_names[m]]['kcal'] = int(sums[k])
+
+    # Record-level detail is only printed in verbose mode; walk just the
+    # matching rows for that.
+    if not verbose:
+        return daily_summary
+    for i in np.flatnonzero(in_range).tolist():
+        e = entries[i]
+        day = daily_summary[start_date + timedelta(days=int(day_idx[i]))]
+        if e['type'] == 'food':
+            day['meals'][e.get('meal', 'unspecified')]['details'].append(e)
+        elif e['type'] == 'activity':
+            day['activities'].append(e)
+        else:
+            day['fluid_groups'][e.get('description', 'unspecified')].append(e)
+
+    return daily_summary
+
+# --- parallel aggregation ---
+#
+# Workers are forked, so they see the parent's entry list without it being
+# pickled. Forking copies only the calling thread, and any lock another
+# thread holds at that moment (the journal's, logging's) stays held in the
+# child forever, so a process with other threads running (`caltrack serve`
+# handles each request on its own thread) uses the single-process paths. Each
+# worker aggregates one contiguous slice into a partial keyed by ISO
+# day and hands back totals, plus entry indexes rather than entries for the
+# verbose detail. Merging the partials in slice order reproduces the serial
+# result exactly, including the order meals and fluids are listed in.
+
+_shared_entries = None
+
+def _aggregate_slice(bounds):
+    lo, hi, start_key, end_key, verbose = bounds
+    entries = _shared_entries
+    partial = {}
+    for i in range(lo, hi):
+        e = entries[i]
+        key = e['date'][:10]
+        if key < start_key or key > end_key:
+            continue
+        t = e['type']
+        if t == 'food':
+            v = e.get('kcal')
+        elif t == 'activity':
+            v = e.get('kcal_burned')
+        elif t == 'fluid':
+            v = e.get('volume_ml')
+        else:
+            continue
+        if v is None:
+            continue
+        day = partial.get(key)
+        if day is None:
+            # [food, activity, fluids_ml, {meal: [kcal, detail idx]}, activity idx, {fluid: idx}]
+            day = partial[key] = [0, 0, 0, {}, [], {}]
+        if t == 'food':
+            day[0] += v
+            meal = day[3].setdefault(e.get('meal', 'unspecified'), [0, []])
+            meal[0] += v
+            if verbose:
+                meal[1].append(i)
+        elif t == 'activity':
+            day[1] += v
+            if verbose:
+                day[4].append(i)
+        else:
+            day[2] += v
+            if verbose:
+                day[5].setdefault(e.get('description', 'unspecified'), []).append(i)
+    return partial
+
+def _summary_workers() -> int:
+    return int(config.get("summary_workers", os.cpu_count() or 1))
+
+def _parallel_min_entries() -> int:
+    return int(config.get("summary_parallel_min", DEFAULT_PARALLEL_MIN_ENTRIES))
+
+def _fork_context():
+    """The fork context, or None where forking isn't available or isn't safe."""
+    import multiprocessing
+    import threading
+    if threading.active_count() > 1:
+        return None
+    try:
+        return multiprocessing.get_context('fork')
+    except ValueError:  # no fork on this platform; stay serial
+        return None
+
+def _aggregate_parallel(entries, start_date, end_date, verbose, workers, context):
+    from concurrent.futures import ProcessPoolExecutor
+    global _shared_entries
+    step = -(-len(entries) // workers)
+    bounds = [(lo, min(lo + step, len(entries)), start_date.isoformat(), end_date.isoformat(), verbose)
+              for lo in range(0, len(entries), step)]
+    _shared_entries = entries
+    try:
+        with ProcessPoolExecutor(max_workers=len(bounds), mp_context=context) as pool:
+            partials = list(pool.map(_aggregate_slice, bounds))
+    finally:
+        _shared_entries = None
+    metrics.count("summary.workers", len(bounds))
+
+    daily_summary = _new_daily_summary()
+    for partial in partials:
+        for key, (food, activity, fluids_ml, meals, activities, fluids) in partial.items():
+            day = daily_summary[date.fromisoformat(key)]
+            day['food'] += food
+            day['activity'] += activity
+            day['fluids_ml'] += fluids_ml
+            for meal, (kcal, idx) in meals.items():
+                day['meals'][meal]['kcal'] += kcal
+                day['meals'][meal]['details'].extend(entries[i] for i in idx)
+            day['activities'].extend(entries[i] for i in activities)
+            for desc, idx in fluids.items():
+                day['fluid_groups'][desc].extend(entries[i] for i in idx)
+    return daily_summary
+
+def aggregate(entries, start_date, end_date, verbose=False):
+    """Per-day totals for the entries in [start_date, end_date], in the shape _print_summary reads.
+
+    Large inputs are split across a process pool when there is more than
+    one worker to use; otherwise numpy or the per-record loop is used.
+    """
+    workers = _summary_workers()
+    if workers > 1 and len(entries) >= _parallel_min_entries():
+        context = _fork_context()
+        if context is not None:
+            return _aggregate_parallel(entries, start_date, end_date, verbose, workers, context)
+    if len(entries) >= NUMPY_MIN_ENTRIES and _load_numpy():
+        return _aggregate_numpy(entries, start_date, end_date, verbose)
+    return _aggregate(entries, start_date, end_date, verbose)
+
+def summarize_entries(entries, start_date, end_date, verbose=False):
+    with metrics.timer("summary.aggregate"):
+        daily_summary = aggregate(entries, start_date, end_date, verbose)
+    _print_summary(daily_summary, start_date, end_date, verbose)
+
+def summarize_daily_totals(days, start_date, end_date):
+    """Print the non-verbose summary from precomputed per-day totals.
+
+    `days` maps ISO dates to the rollup totals kept by the storage layer
+    (see caltrack.storage.rollup); output matches summarize_entries.
+    """
+    daily_summary = _new_daily_summary()
+    for key, totals in days.items():
+        d = date.fromisoformat(key)
+        if start_date <= d <= end_date:
+            day = daily_summary[d]
+            day['food'] = totals['food']
+            day['activity'] = totals['activity']
+            day['fluids_ml'] = totals['fluids_ml']
+            for meal, kcal in totals['meals'].items():
+                day['meals'][meal]['kcal'] = kcal
+    _print_summary(daily_summary, start_date, end_date, verbose=False)
+
+@metrics.timed("summary.render")
+def _print_summary(daily_summary, start_date, end_date, verbose):
     total_food = sum(day['food'] for day in daily_summary.values())
     total_activity = sum(day['activity'] for day in daily_summary.values())
     total_fluids = sum(day['fluids_ml'] for day in daily_summary.values())
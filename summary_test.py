@@ -0,0 +1,71 @@
+import random
+import threading
+from datetime import date, timedelta
+import pytest
+from caltrack import summary
+
+START, END = date(2024, 1, 1), date(2024, 1, 31)
+
+def _entries(n):
+    rng = random.Random(5)
+    out = []
+    for i in range(n):
+        day = (START + timedelta(days=rng.randrange(40) - 5)).isoformat()
+        t = rng.choice(('food', 'activity', 'fluid'))
+        e = {"id": f"{i:08x}", "date": day, "type": t, "description": rng.choice(("water", "tea", "soup"))}
+        if t == 'food':
+            e['kcal'] = rng.randrange(50, 900)
+            if rng.random() < 0.9:  # the rest fall under "unspecified"
+                e['meal'] = rng.choice(("breakfast", "lunch", "dinner", "snack"))
+        elif t == 'activity':
+            e['kcal_burned'] = rng.randrange(50, 600)
+        else:
+            e['volume_ml'] = rng.randrange(100, 750)
+        out.append(e)
+    return out
+
+def _render(capsys, daily_summary, verbose):
+    summary._print_summary(daily_summary, START, END, verbose)
+    return capsys.readouterr().out
+
+@pytest.mark.parametrize("verbose", [False, True])
+def test_parallel_aggregate_matches_serial(capsys, verbose):
+    context = summary._fork_context()
+    if context is None:
+        pytest.skip("no fork here")
+    entries = _entries(3000)
+    serial = _render(capsys, summary._aggregate(entries, START, END, verbose), verbose)
+    parallel = _render(capsys, summary._aggregate_parallel(entries, START, END, verbose, 3, context), verbose)
+    assert parallel == serial
+
+def test_no_fork_while_other_threads_run():
+    stop = threading.Event()
+    worker = threading.Thread(target=stop.wait)
+    worker.start()
+    try:
+        assert summary._fork_context() is None
+    finally:
+        stop.set()
+        worker.join()
+
+@pytest.mark.parametrize("verbose", [False, True])
+def test_numpy_output_matches_the_per_record_loop(capsys, monkeypatch, verbose):
+    if not summary._load_numpy():
+        pytest.skip("numpy not installed")
+    monkeypatch.setenv("CALTRACK_SUMMARY_WORKERS", "1")
+    entries = _entries(summary.NUMPY_MIN_ENTRIES + 500)
+    assert summary._columns(entries) is not None  # really on the numpy path
+    summary.summarize_entries(entries, START, END, verbose)
+    with_numpy = capsys.readouterr().out
+    monkeypatch.setattr(summary, "_load_numpy", lambda: False)
+    summary.summarize_entries(entries, START, END, verbose)
+    assert capsys.readouterr().out == with_numpy
+
+def test_daily_totals_output_matches_summarize_entries(capsys, monkeypatch):
+    from caltrack.storage import rollup
+    monkeypatch.setenv("CALTRACK_SUMMARY_WORKERS", "1")
+    entries = _entries(summary.NUMPY_MIN_ENTRIES + 500)
+    summary.summarize_entries(entries, START, END)
+    expected = capsys.readouterr().out
+    summary.summarize_daily_totals(rollup.build(entries), START, END)
+    assert capsys.readouterr().out == expected